@@ -0,0 +1,339 @@
+# async_main.py - نقطة تشغيل بديلة: AsyncTeleBot مع خادم webhook على aiohttp
+# التشغيل: python async_main.py (يتطلب WEBHOOK_URL)
+#
+# القوائم والأزرار الخفيفة تُعالج في حلقة asyncio مباشرة، واستدعاءات MongoDB في executor.
+# التدفقات الطويلة (إنشاء الحساب وخطوات next_step) تبقى في البوت المتزامن وتمر عبر المُوزّع.
+import os
+import time
+import asyncio
+import logging
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+
+import db
+import startup_timing
+import telegram_sender
+import membership_cache
+import main
+from update_dispatcher import update_key
+from config import BOT_TOKEN, CHANNEL_ID, CHANNEL_INVITE_LINK
+from session_manager import ensure_session
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# الإعدادات
+# =========================
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+PORT = int(os.getenv("PORT", "3000"))
+ASYNC_BLOCKING_WORKERS = int(os.getenv("ASYNC_BLOCKING_WORKERS", "8"))
+# أقصى عدد تحديثات قيد المعالجة في الحلقة؛ ما زاد عنه يُرفض بـ 503 ويعيد Telegram إرساله
+ASYNC_MAX_INFLIGHT = int(os.getenv("ASYNC_MAX_INFLIGHT", "200"))
+
+# أزرار تبدأ تدفقات البوت المتزامن (Selenium وخطوات next_step)
+SYNC_CALLBACKS = {"ichancy_create", "ichancy_deposit", "ichancy_withdraw"}
+# مدة توجيه كل تحديثات المستخدم إلى البوت المتزامن بعد آخر تحديث فُوض له
+SYNC_FLOW_TTL = float(os.getenv("ASYNC_SYNC_FLOW_TTL", "600"))
+
+if not WEBHOOK_URL:
+    raise ValueError("❌ WEBHOOK_URL غير موجود")
+
+abot = AsyncTeleBot(BOT_TOKEN, parse_mode="Markdown")
+# نفس دلاء الإرسال ومعالجة 429 ودمج التعديلات التي يمر بها main.bot (نفس التوكن)
+telegram_sender.install_async(abot)
+blocking_executor = ThreadPoolExecutor(max_workers=ASYNC_BLOCKING_WORKERS, thread_name_prefix="blocking")
+# thread واحد للتفويض: تحديثات نفس المستخدم تصل إلى المُوزّع بترتيب وصولها
+delegate_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="delegate")
+
+_tasks = set()
+_sync_flows = {}  # user_id -> آخر وقت فُوض فيه تحديث للبوت المتزامن
+_stats = {"received": 0, "async": 0, "delegated": 0, "failed": 0, "rejected": 0}
+
+
+async def blocking(fn, *args, **kwargs):
+    """تشغيل استدعاء متزامن (MongoDB/Redis/Selenium) دون حجز حلقة الأحداث"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(blocking_executor, partial(fn, *args, **kwargs))
+
+# =========================
+# التوجيه بين البوتين
+# =========================
+def needs_sync_bot(update):
+    """هل التحديث يخص تدفقاً يملكه البوت المتزامن؟
+
+    بعد تفويض زر من SYNC_CALLBACKS تذهب كل تحديثات المستخدم إلى المُوزّع حتى تمر
+    SYNC_FLOW_TTL دون تفويض جديد. العلامة تُضبط قبل التفويض، فالرد المكتوب فوراً
+    (اسم المستخدم، المبلغ...) يصل إلى نفس مسار المستخدم بعد تسجيل خطوة next_step،
+    والبوت المتزامن يملك أيضاً معالجات القوائم فلا يضيع شيء إن انتهى التدفق قبل ذلك.
+    """
+    key = update_key(update)
+    now = time.monotonic()
+    if len(_sync_flows) > 10000:
+        for k in [k for k, t in _sync_flows.items() if now - t > SYNC_FLOW_TTL]:
+            del _sync_flows[k]
+    if update.callback_query and update.callback_query.data in SYNC_CALLBACKS:
+        _sync_flows[key] = now
+        return True
+    started = _sync_flows.get(key)
+    if started is None:
+        return False
+    if now - started > SYNC_FLOW_TTL:
+        del _sync_flows[key]
+        return False
+    _sync_flows[key] = now
+    return True
+
+
+async def process_update(update, delegate):
+    try:
+        if delegate:
+            _stats["delegated"] += 1
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(delegate_executor, main.dispatcher.submit, update)
+        else:
+            _stats["async"] += 1
+            await abot.process_new_updates([update])
+    except Exception as e:
+        _stats["failed"] += 1
+        logger.error(f"❌ فشل معالجة تحديث: {e}")
+
+# =========================
+# التحقق من الاشتراك
+# =========================
+async def check_channel_membership(chat_id, user_id, trust_negative=True):
+    cached = await blocking(membership_cache.get, chat_id, user_id)
+    if cached or (cached is False and trust_negative):
+        return cached
+
+    try:
+        member = await abot.get_chat_member(chat_id, user_id)
+    except Exception as e:
+        logger.error(f"❌ خطأ في التحقق من العضوية: {e}")
+        return False
+
+    await blocking(membership_cache.set_status, chat_id, user_id, member.status)
+    return member.status in membership_cache.MEMBER_STATUSES
+
+
+@abot.chat_member_handler()
+async def handle_chat_member(update):
+    if update.chat.id != CHANNEL_ID:
+        return
+    await blocking(membership_cache.set_status, CHANNEL_ID, update.new_chat_member.user.id, update.new_chat_member.status)
+
+
+async def show_main_menu(chat_id, message_id=None):
+    text = "🏠 **القائمة الرئيسية**\n\nاختر الخدمة التي تريدها:"
+    if message_id:
+        await abot.edit_message_text(text, chat_id=chat_id, message_id=message_id, reply_markup=main.build_main_menu())
+    else:
+        await abot.send_message(chat_id, text, reply_markup=main.build_main_menu())
+
+# =========================
+# /start
+# =========================
+@abot.message_handler(commands=["start", "menu"])
+async def send_welcome(message):
+    user_id = message.from_user.id
+    logger.info(f"👤 مستخدم جديد: {user_id} - {message.from_user.username or ''}")
+
+    if CHANNEL_ID and CHANNEL_INVITE_LINK:
+        if not await check_channel_membership(CHANNEL_ID, user_id):
+            await abot.send_message(message.chat.id, main.CHANNEL_REQUIREMENT_TEXT, reply_markup=main.build_channel_keyboard())
+            return
+
+    user = await blocking(db.get_user, user_id)
+    if not user:
+        await blocking(
+            db.create_user,
+            telegram_id=user_id,
+            username=message.from_user.username or "",
+            first_name=message.from_user.first_name or "",
+            last_name=message.from_user.last_name or ""
+        )
+        logger.info(f"✅ تم إنشاء مستخدم جديد: {user_id}")
+
+    if not user or not user.get("accepted_terms"):
+        await abot.send_message(message.chat.id, main.TERMS_TEXT, reply_markup=main.build_terms_keyboard(user_id))
+        return
+
+    await show_main_menu(message.chat.id)
+
+# =========================
+# الاشتراك والشروط
+# =========================
+@abot.callback_query_handler(func=lambda c: c.data == "check_join")
+async def handle_check_join(call):
+    if await check_channel_membership(CHANNEL_ID, call.from_user.id, trust_negative=False):
+        await blocking(db.mark_channel_joined, call.from_user.id)
+        await abot.answer_callback_query(call.id, "✅ تم التحقق من الاشتراك!")
+        await abot.send_message(call.message.chat.id, main.TERMS_TEXT, reply_markup=main.build_terms_keyboard(call.from_user.id))
+    else:
+        await abot.answer_callback_query(
+            call.id,
+            "❌ لم نراك في القناة بعد!\nانضم أولاً ثم اضغط على الزر مرة أخرى.",
+            show_alert=True
+        )
+
+
+@abot.callback_query_handler(func=lambda c: c.data.startswith("accept_terms"))
+async def handle_accept_terms(call):
+    try:
+        user_id = int(call.data.split(":")[1])
+        if call.from_user.id != user_id:
+            await abot.answer_callback_query(call.id, "❌ هذا الزر ليس لك!")
+            return
+
+        await blocking(db.accept_terms, user_id)
+        await abot.edit_message_text(
+            "✅ **تم قبول الشروط بنجاح!**\n\n"
+            "يمكنك الآن استخدام جميع ميزات البوت.",
+            chat_id=call.message.chat.id,
+            message_id=call.message.message_id
+        )
+        await abot.answer_callback_query(call.id, "تم قبول الشروط!")
+
+        await asyncio.sleep(2)
+        await show_main_menu(call.message.chat.id)
+    except Exception as e:
+        logger.error(f"❌ خطأ في قبول الشروط: {e}")
+        await abot.answer_callback_query(call.id, "❌ حدث خطأ!")
+
+
+@abot.callback_query_handler(func=lambda c: c.data.startswith("reject_terms"))
+async def handle_reject_terms(call):
+    await abot.answer_callback_query(
+        call.id,
+        "❌ لا يمكنك استخدام البوت بدون قبول الشروط.\n\n"
+        "إذا غيرت رأيك، استخدم /start مرة أخرى.",
+        show_alert=True
+    )
+
+# =========================
+# القوائم
+# =========================
+@abot.callback_query_handler(func=lambda c: c.data == "ichancy")
+async def handle_ichancy(call):
+    user = await blocking(db.get_user, call.from_user.id)
+    if not user:
+        await abot.answer_callback_query(call.id, "❌ المستخدم غير موجود!")
+        return
+
+    text, keyboard = main.build_ichancy_menu(user)
+    await abot.edit_message_text(text, call.message.chat.id, call.message.message_id, reply_markup=keyboard)
+    await abot.answer_callback_query(call.id)
+
+
+@abot.callback_query_handler(func=lambda c: c.data == "refresh_account")
+async def handle_refresh_account(call):
+    user = await blocking(db.get_user, call.from_user.id)
+    if not user or not user.get("player_username"):
+        await abot.answer_callback_query(call.id, "❌ لا يوجد حساب لتحديثه!")
+        return
+
+    await abot.answer_callback_query(call.id, "⏳ جاري تحديث البيانات...")
+    await abot.send_message(
+        call.message.chat.id,
+        f"🔄 **تحديث البيانات**\n\n"
+        f"سيتم إضافة هذه الميزة قريباً.\n\n"
+        f"حسابك الحالي:\n"
+        f"👤 المستخدم: `{user.get('player_username')}`"
+    )
+
+
+@abot.callback_query_handler(func=lambda c: c.data == "back_main")
+async def handle_back_main(call):
+    await show_main_menu(call.message.chat.id, call.message.message_id)
+    await abot.answer_callback_query(call.id)
+
+
+@abot.callback_query_handler(func=lambda c: c.data in main.BUTTON_TEXTS)
+async def handle_other_buttons(call):
+    await abot.edit_message_text(
+        main.BUTTON_TEXTS[call.data],
+        call.message.chat.id,
+        call.message.message_id,
+        reply_markup=main.build_back_keyboard()
+    )
+    await abot.answer_callback_query(call.id)
+
+
+@abot.callback_query_handler(func=lambda call: True)
+async def handle_unknown_callback(call):
+    await abot.answer_callback_query(call.id, "❌ هذا الزر غير معروف!")
+
+# =========================
+# خادم aiohttp
+# =========================
+async def webhook(request):
+    data = await request.json()
+    _stats["received"] += 1
+    if len(_tasks) >= ASYNC_MAX_INFLIGHT:
+        # ضغط عكسي: Telegram يعيد إرسال التحديث لاحقاً بدل تراكم المهام في الذاكرة
+        _stats["rejected"] += 1
+        return web.Response(status=503, text="Busy")
+    # قرار التوجيه هنا بترتيب وصول الطلبات، قبل أي await في المهام
+    update = types.Update.de_json(data)
+    # الرد فوراً والمعالجة في مهمة مستقلة
+    task = asyncio.create_task(process_update(update, needs_sync_bot(update)))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return web.Response(text="OK")
+
+
+async def index(request):
+    return web.Response(text="🤖 Bot is running (async)")
+
+
+async def health(request):
+    session = ensure_session()
+    ready = await blocking(session.is_ready)
+    return web.json_response({
+        "bot": "running",
+        "mode": "async",
+        "api": "ready" if ready else "not_ready",
+        "session": await blocking(session.stats),
+        "startup": startup_timing.report(),
+    })
+
+
+async def metrics(request):
+    return web.json_response({
+        "updates": dict(_stats, in_flight=len(_tasks), max_in_flight=ASYNC_MAX_INFLIGHT, sync_flows=len(_sync_flows)),
+        "dispatcher": main.dispatcher.stats(),
+        "telegram_sender": telegram_sender.get_sender().stats(),
+    })
+
+
+async def on_startup(app):
+    await abot.remove_webhook()
+    await abot.set_webhook(f"{WEBHOOK_URL}/{BOT_TOKEN}", allowed_updates=main.ALLOWED_UPDATES)
+    startup_timing.mark("webhook_ready")
+    # تسخين جلسة iChancy دون تأخير بدء الخادم
+    asyncio.get_running_loop().run_in_executor(blocking_executor, main.init_ichancy_api)
+
+
+async def on_cleanup(app):
+    await abot.close_session()
+    blocking_executor.shutdown(wait=False)
+    delegate_executor.shutdown(wait=False)
+
+
+def create_app():
+    app = web.Application()
+    app.router.add_post(f"/{BOT_TOKEN}", webhook)
+    app.router.add_get("/", index)
+    app.router.add_get("/health", health)
+    app.router.add_get("/metrics", metrics)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+if __name__ == "__main__":
+    logger.info(f"🌐 تشغيل خادم aiohttp على المنفذ {PORT}")
+    web.run_app(create_app(), host="0.0.0.0", port=PORT)
@@ -0,0 +1,64 @@
+# bench_resource_blocking.py - قياس زمن تحميل اللوحة وذاكرة Chrome لكل سياسة حظر
+# الاستخدام: python bench_resource_blocking.py [عدد المرات] [السياسات...]
+#   مثال: python bench_resource_blocking.py 5 off light strict
+import sys
+import time
+import json
+import logging
+
+import resource_blocking
+from ichancy_api_selenium import IChancySeleniumAPI
+
+logging.basicConfig(level=logging.WARNING)
+
+
+def bench_policy(policy, runs):
+    """تشغيل متصفح جديد بالسياسة وقياس تحميل صفحة اللوحة runs مرة"""
+    api = IChancySeleniumAPI(headless=True, wait_profile="fast", block_policy=policy)
+    try:
+        # قياس سياسة ما بعد تسجيل الدخول (الصفحة بدون كوكيز تعرض نموذج الدخول)
+        resource_blocking.apply(api.driver, policy)
+        url = f"{api.BASE_URL}/dashboard"
+        timings = []
+        for _ in range(runs):
+            api.driver.delete_all_cookies()
+            started = time.perf_counter()
+            api.driver.get(url)
+            api.wait.page_loaded(timeout=60)
+            timings.append(time.perf_counter() - started)
+
+        # عدد الموارد التي حُمّلت فعلاً في آخر تحميل
+        resources = api.driver.execute_script(
+            "return performance.getEntriesByType('resource').length"
+        )
+        timings.sort()
+        return {
+            "policy": policy,
+            "runs": runs,
+            "load_avg_ms": round(sum(timings) / len(timings) * 1000),
+            "load_p50_ms": round(timings[len(timings) // 2] * 1000),
+            "load_max_ms": round(timings[-1] * 1000),
+            "resources": resources,
+            "chrome_rss_mb": api.browser_rss_mb(),
+        }
+    finally:
+        api.close()
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    policies = sys.argv[2:] or ["off", "light", "strict"]
+
+    results = [bench_policy(policy, runs) for policy in policies]
+
+    print(f"{'policy':<8} {'avg ms':>8} {'p50 ms':>8} {'max ms':>8} {'res':>5} {'rss MB':>8}")
+    for r in results:
+        print(
+            f"{r['policy']:<8} {r['load_avg_ms']:>8} {r['load_p50_ms']:>8} "
+            f"{r['load_max_ms']:>8} {r['resources']:>5} {r['chrome_rss_mb'] or '-':>8}"
+        )
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+# browser_pool.py - مجمع متصفحات Selenium مسجلة الدخول
+import os
+import time
+import threading
+import logging
+from collections import deque
+from contextlib import contextmanager
+
+import startup_timing
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# الإعدادات
+# =========================
+POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+POOL_MAX_WAITERS = int(os.getenv("BROWSER_POOL_MAX_WAITERS", "20"))
+POOL_CHECKOUT_TIMEOUT = float(os.getenv("BROWSER_POOL_CHECKOUT_TIMEOUT", "120"))
+POOL_MAX_FAILURES = int(os.getenv("BROWSER_POOL_MAX_FAILURES", "3"))
+
+# إعادة تدوير المتصفح قبل أن يتضخم: بعد عدد عمليات أو تجاوز حد الذاكرة (0 = تعطيل)
+POOL_RECYCLE_OPERATIONS = int(os.getenv("BROWSER_POOL_RECYCLE_OPERATIONS", "200"))
+POOL_RECYCLE_RSS_MB = float(os.getenv("BROWSER_POOL_RECYCLE_RSS_MB", "700"))
+POOL_RSS_CHECK_EVERY = max(1, int(os.getenv("BROWSER_POOL_RSS_CHECK_EVERY", "5")))
+
+# متصفح احتياطي مسجل الدخول خارج الخانات يُسلَّم فوراً عند الحاجة لمتصفح جديد
+# (فقط في العمليات التي تستدعي start: المجمع المنشأ عند أول استخدام لا يحتفظ باحتياطي)
+POOL_STANDBY = os.getenv("BROWSER_POOL_STANDBY", "1") == "1"
+
+
+class PoolExhausted(Exception):
+    """لا يوجد متصفح متاح وطابور الانتظار ممتلئ أو انتهت مهلة الانتظار"""
+
+
+class BrowserSlot:
+    """خانة في المجمع تحمل متصفحاً واحداً وحالته الصحية"""
+
+    def __init__(self, index):
+        self.index = index
+        self.api = None
+        self.healthy = False
+        self.in_use = False
+        self.spawning = False
+        self.failures = 0
+        self.operations = 0
+        self.driver_operations = 0  # منذ تشغيل المتصفح الحالي
+        self.rss_mb = None
+        self.recycles = 0
+        self.last_used = None
+        self.last_error = None
+
+    def to_dict(self):
+        return {
+            "index": self.index,
+            "alive": self.api is not None,
+            "healthy": self.healthy,
+            "in_use": self.in_use,
+            "failures": self.failures,
+            "operations": self.operations,
+            "driver_operations": self.driver_operations,
+            "rss_mb": self.rss_mb,
+            "recycles": self.recycles,
+            "last_used": self.last_used,
+            "last_error": self.last_error,
+            "waits": self.api.wait.report() if self.api and self.api.wait else None,
+        }
+
+
+class BrowserPool:
+    """مجمع من N متصفح مسجل الدخول مع استعارة/إرجاع وطابور انتظار محدود"""
+
+    def __init__(self, size=POOL_SIZE, max_waiters=POOL_MAX_WAITERS, headless=True):
+        self.size = max(1, size)
+        self.max_waiters = max_waiters
+        self.headless = headless
+
+        self._cond = threading.Condition()
+        self._slots = [BrowserSlot(i) for i in range(self.size)]
+        self._idle = deque()
+        self._waiters = 0
+        self._standby = None
+        self._standby_spawning = False
+        self.standby_enabled = False
+
+    # =========================
+    # إنشاء المتصفحات
+    # =========================
+    def _new_api(self):
+        """تشغيل متصفح (استيراد Selenium مؤجل حتى أول حاجة فعلية)"""
+        from ichancy_api_selenium import IChancySeleniumAPI
+        startup_timing.mark("selenium_imported")
+        return IChancySeleniumAPI(headless=self.headless)
+
+    def _take_standby(self):
+        with self._cond:
+            api, self._standby = self._standby, None
+            return api
+
+    def _refill_standby(self):
+        """تجهيز متصفح احتياطي جديد في الخلفية إذا لم يكن موجوداً"""
+        with self._cond:
+            if not self.standby_enabled or self._standby or self._standby_spawning:
+                return
+            self._standby_spawning = True
+        threading.Thread(target=self._build_standby, daemon=True).start()
+
+    def _build_standby(self):
+        api = None
+        try:
+            api = self._new_api()
+            api.ensure_login()
+        except Exception as e:
+            logger.warning(f"⚠️ فشل تجهيز المتصفح الاحتياطي: {e}")
+            if api:
+                api.close()
+            with self._cond:
+                self._standby_spawning = False
+            return
+
+        with self._cond:
+            self._standby = api
+            self._standby_spawning = False
+        startup_timing.mark("standby_ready")
+        logger.info("🧊 المتصفح الاحتياطي جاهز")
+
+    def _spawn(self, slot):
+        """إنشاء متصفح جديد للخانة وتسجيل الدخول (يُستدعى خارج القفل)"""
+        api = self._take_standby()
+        if api:
+            logger.info(f"🧊 استخدام المتصفح الاحتياطي في الخانة {slot.index}")
+        else:
+            logger.info(f"🚀 تشغيل متصفح جديد في الخانة {slot.index}...")
+        try:
+            api = api or self._new_api()
+            # سريع للمتصفح الاحتياطي: الجلسة مثبتة مسبقاً
+            api.ensure_login()
+        except Exception as e:
+            logger.error(f"❌ فشل تشغيل المتصفح في الخانة {slot.index}: {e}")
+            if api:
+                api.close()
+            with self._cond:
+                slot.spawning = False
+                slot.healthy = False
+                slot.last_error = str(e)
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            slot.api = api
+            slot.spawning = False
+            slot.healthy = True
+            slot.failures = 0
+            slot.driver_operations = 0
+            slot.rss_mb = None
+            slot.last_error = None
+        startup_timing.mark("first_browser_ready")
+        logger.info(f"✅ المتصفح في الخانة {slot.index} جاهز")
+        self._refill_standby()
+
+    def start(self, prewarm=1, standby=POOL_STANDBY):
+        """تسخين عدد من المتصفحات في الخلفية"""
+        with self._cond:
+            self.standby_enabled = standby
+        for slot in self._slots[:max(0, min(prewarm, self.size))]:
+            with self._cond:
+                if slot.api or slot.spawning:
+                    continue
+                slot.spawning = True
+            threading.Thread(target=self._prewarm, args=(slot,), daemon=True).start()
+
+    def _prewarm(self, slot):
+        try:
+            self._spawn(slot)
+        except Exception:
+            return
+        with self._cond:
+            self._idle.append(slot)
+            self._cond.notify()
+
+    # =========================
+    # إعادة التدوير
+    # =========================
+    def _recycle_reason(self, slot):
+        """سبب إعادة تدوير متصفح الخانة أو None (يُستدعى خارج القفل)"""
+        if POOL_RECYCLE_OPERATIONS and slot.driver_operations >= POOL_RECYCLE_OPERATIONS:
+            return f"{slot.driver_operations} عملية"
+
+        if POOL_RECYCLE_RSS_MB and slot.driver_operations % POOL_RSS_CHECK_EVERY == 0:
+            try:
+                slot.rss_mb = slot.api.browser_rss_mb()
+            except Exception as e:
+                logger.debug(f"RSS read failed: {e}")
+                return None
+            if slot.rss_mb and slot.rss_mb >= POOL_RECYCLE_RSS_MB:
+                return f"ذاكرة {slot.rss_mb}MB"
+        return None
+
+    def _recycle(self, slot, old_api):
+        """إغلاق المتصفح القديم أولاً (لتحرير الذاكرة) ثم تشغيل بديل يأخذ الكوكيز من Redis"""
+        old_api.close()
+        self._prewarm(slot)
+
+    # =========================
+    # الاستعارة والإرجاع
+    # =========================
+    def checkout(self, timeout=None):
+        """استعارة خانة بمتصفح جاهز"""
+        timeout = POOL_CHECKOUT_TIMEOUT if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        with self._cond:
+            if not self._idle and self._waiters >= self.max_waiters:
+                raise PoolExhausted("طابور انتظار المتصفحات ممتلئ")
+
+            self._waiters += 1
+            try:
+                while True:
+                    if self._idle:
+                        slot = self._idle.popleft()
+                        slot.in_use = True
+                        return slot
+
+                    # خانة فارغة؟ ننشئ متصفحاً جديداً بأنفسنا
+                    empty = next((s for s in self._slots if s.api is None and not s.spawning), None)
+                    if empty:
+                        empty.spawning = True
+                        empty.in_use = True
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolExhausted("انتهت مهلة انتظار متصفح متاح")
+                    self._cond.wait(remaining)
+            finally:
+                self._waiters -= 1
+
+        try:
+            self._spawn(empty)
+        except Exception:
+            with self._cond:
+                empty.in_use = False
+            raise
+        return empty
+
+    def checkin(self, slot, failed=False, error=None):
+        """إرجاع الخانة إلى المجمع مع تحديث حالتها الصحية"""
+        broken = None
+        recycle_reason = None
+        slot.operations += 1
+        slot.driver_operations += 1
+        if not failed and slot.api:
+            recycle_reason = self._recycle_reason(slot)
+
+        with self._cond:
+            slot.in_use = False
+            slot.last_used = time.time()
+
+            if failed:
+                slot.failures += 1
+                slot.last_error = str(error) if error else slot.last_error
+                slot.healthy = False
+            else:
+                slot.failures = 0
+                slot.healthy = True
+
+            if slot.failures >= POOL_MAX_FAILURES:
+                logger.warning(f"⚠️ الخانة {slot.index} فشلت {slot.failures} مرات، سيتم إعادة تشغيلها")
+                broken, slot.api = slot.api, None
+                slot.failures = 0
+            elif recycle_reason:
+                logger.info(f"♻️ إعادة تدوير متصفح الخانة {slot.index} ({recycle_reason})")
+                broken, slot.api = slot.api, None
+                slot.spawning = True
+                slot.recycles += 1
+            else:
+                self._idle.append(slot)
+            self._cond.notify()
+
+        if broken and recycle_reason:
+            threading.Thread(target=self._recycle, args=(slot, broken), daemon=True).start()
+        elif broken:
+            broken.close()
+
+    @contextmanager
+    def acquire(self, timeout=None):
+        """with pool.acquire() as api: ..."""
+        slot = self.checkout(timeout)
+        try:
+            yield slot.api
+        except Exception as e:
+            self.checkin(slot, failed=True, error=e)
+            raise
+        else:
+            self.checkin(slot)
+
+    # =========================
+    # الحالة
+    # =========================
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self.size,
+                "idle": len(self._idle),
+                "in_use": sum(1 for s in self._slots if s.in_use),
+                "waiters": self._waiters,
+                "max_waiters": self.max_waiters,
+                "standby": "ready" if self._standby else ("spawning" if self._standby_spawning else None),
+                "slots": [s.to_dict() for s in self._slots],
+            }
+
+    def is_ready(self):
+        with self._cond:
+            return any(s.api is not None and s.healthy for s in self._slots)
+
+    def close(self):
+        with self._cond:
+            apis = [s.api for s in self._slots if s.api]
+            if self._standby:
+                apis.append(self._standby)
+                self._standby = None
+            for s in self._slots:
+                s.api = None
+                s.healthy = False
+            self._idle.clear()
+        for api in apis:
+            api.close()
+
+
+# =========================
+# النسخة المشتركة
+# =========================
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """الحصول على مجمع المتصفحات المشترك في هذه العملية"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+        return _pool
@@ -1,6 +1,10 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument
 from datetime import datetime
+from collections import OrderedDict
 import os
+import copy
+import time
+import threading
 
 # ============================
 # الاتصال بقاعدة البيانات
@@ -59,6 +63,137 @@ ensure_indexes()
 def _db_check():
     return db is not None
 
+# ============================
+# كاش المستخدمين (LRU في الذاكرة + Redis اختياري)
+# ============================
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "2000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))          # الذاكرة المحلية لكل عملية
+USER_CACHE_REDIS = os.getenv("USER_CACHE_REDIS", "0") == "1"
+USER_CACHE_REDIS_TTL = int(os.getenv("USER_CACHE_REDIS_TTL", "300"))
+REDIS_USER_KEY = "user_cache:{telegram_id}"
+REDIS_USER_GEN_KEY = "user_cache:gen:{telegram_id}"
+
+# الكتابة في Redis فقط إذا لم يتغير عداد الإبطال منذ القراءة من MongoDB
+FENCED_PUT_LUA = """
+if (redis.call('GET', KEYS[2]) or '0') == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    return 1
+end
+return 0
+"""
+
+_user_cache = OrderedDict()  # telegram_id -> (وقت التخزين، المستند)
+_user_cache_lock = threading.Lock()
+_user_generations = {}     # telegram_id -> عدد مرات الإبطال في هذه العملية
+_user_cache_stats = {"hits": 0, "redis_hits": 0, "misses": 0, "stale_skipped": 0}
+_redis_client = None
+_fenced_put = None
+
+
+def _user_redis():
+    global _redis_client
+    if not USER_CACHE_REDIS:
+        return None
+    if _redis_client is None:
+        import redis
+        _redis_client = redis.from_url(os.getenv("REDIS_URL"), decode_responses=True)
+    return _redis_client
+
+
+def _generation(telegram_id):
+    """لقطة من عدادي الإبطال (المحلي وRedis) تؤخذ قبل القراءة من المصدر"""
+    with _user_cache_lock:
+        local = _user_generations.get(telegram_id, 0)
+
+    remote = None
+    client = _user_redis()
+    if client:
+        try:
+            remote = client.get(REDIS_USER_GEN_KEY.format(telegram_id=telegram_id)) or "0"
+        except Exception as e:
+            print(f"⚠️ user cache redis read error: {e}")
+    return local, remote
+
+
+def _cache_get(telegram_id, generation):
+    with _user_cache_lock:
+        entry = _user_cache.get(telegram_id)
+        if entry and time.monotonic() - entry[0] < USER_CACHE_TTL:
+            _user_cache.move_to_end(telegram_id)
+            _user_cache_stats["hits"] += 1
+            return copy.deepcopy(entry[1])
+
+    client = _user_redis()
+    if client:
+        try:
+            data = client.get(REDIS_USER_KEY.format(telegram_id=telegram_id))
+            if data:
+                from bson import json_util
+                user = json_util.loads(data)
+                _cache_put(telegram_id, user, generation, to_redis=False)
+                with _user_cache_lock:
+                    _user_cache_stats["redis_hits"] += 1
+                return user
+        except Exception as e:
+            print(f"⚠️ user cache redis read error: {e}")
+
+    with _user_cache_lock:
+        _user_cache_stats["misses"] += 1
+    return None
+
+
+def _cache_put(telegram_id, user, generation, to_redis=True):
+    """تخزين المستند فقط إذا لم يُبطل المستخدم منذ أُخذت اللقطة generation"""
+    local, remote = generation
+    with _user_cache_lock:
+        if _user_generations.get(telegram_id, 0) != local:
+            # كتابة حدثت أثناء القراءة: المستند الذي معنا قديم
+            _user_cache_stats["stale_skipped"] += 1
+            return
+        _user_cache[telegram_id] = (time.monotonic(), copy.deepcopy(user))
+        _user_cache.move_to_end(telegram_id)
+        while len(_user_cache) > USER_CACHE_SIZE:
+            _user_cache.popitem(last=False)
+
+    client = _user_redis() if to_redis and remote is not None else None
+    if client:
+        try:
+            from bson import json_util
+            global _fenced_put
+            if _fenced_put is None:
+                _fenced_put = client.register_script(FENCED_PUT_LUA)
+            _fenced_put(
+                keys=[REDIS_USER_KEY.format(telegram_id=telegram_id), REDIS_USER_GEN_KEY.format(telegram_id=telegram_id)],
+                args=[remote, json_util.dumps(user), USER_CACHE_REDIS_TTL],
+            )
+        except Exception as e:
+            print(f"⚠️ user cache redis write error: {e}")
+
+
+def invalidate_user(telegram_id):
+    """حذف المستخدم من الكاش بعد أي كتابة عليه ورفع عداد الإبطال"""
+    with _user_cache_lock:
+        _user_cache.pop(telegram_id, None)
+        _user_generations[telegram_id] = _user_generations.get(telegram_id, 0) + 1
+
+    client = _user_redis()
+    if client:
+        try:
+            gen_key = REDIS_USER_GEN_KEY.format(telegram_id=telegram_id)
+            pipe = client.pipeline()
+            pipe.incr(gen_key)
+            pipe.expire(gen_key, USER_CACHE_REDIS_TTL * 2)
+            pipe.delete(REDIS_USER_KEY.format(telegram_id=telegram_id))
+            pipe.execute()
+        except Exception as e:
+            print(f"⚠️ user cache redis delete error: {e}")
+
+
+def user_cache_stats():
+    with _user_cache_lock:
+        return dict(_user_cache_stats, size=len(_user_cache), max_size=USER_CACHE_SIZE, redis=USER_CACHE_REDIS)
+
 # ============================
 # المستخدمين
 # ============================
@@ -66,7 +201,16 @@ def _db_check():
 def get_user(telegram_id):
     if not _db_check():
         return None
-    return users.find_one({"telegram_id": telegram_id})
+
+    generation = _generation(telegram_id)
+    user = _cache_get(telegram_id, generation)
+    if user is not None:
+        return user
+
+    user = users.find_one({"telegram_id": telegram_id})
+    if user is not None:
+        _cache_put(telegram_id, user, generation)
+    return user
 
 
 def create_user(telegram_id, username, first_name, last_name):
@@ -98,6 +242,7 @@ def create_user(telegram_id, username, first_name, last_name):
 
     try:
         users.insert_one(user_data)
+        invalidate_user(telegram_id)
         return True
     except Exception as e:
         print(f"❌ create_user error: {e}")
@@ -108,7 +253,17 @@ def update_user(telegram_id, update_data):
     if not _db_check():
         return False
     update_data["updated_at"] = datetime.utcnow()
-    return users.update_one({"telegram_id": telegram_id}, {"$set": update_data})
+    result = users.update_one({"telegram_id": telegram_id}, {"$set": update_data})
+    invalidate_user(telegram_id)
+    return result
+
+
+def mark_channel_joined(telegram_id):
+    return update_user(telegram_id, {"joined_channel": True, "joined_channel_at": datetime.utcnow()})
+
+
+def accept_terms(telegram_id):
+    return update_user(telegram_id, {"accepted_terms": True, "accepted_terms_at": datetime.utcnow()})
 
 
 def update_player_info(telegram_id, player_id, player_username, player_email, player_password):
@@ -123,7 +278,55 @@ def update_player_info(telegram_id, player_id, player_username, player_email, pl
     )
 
 
-def log_transaction(telegram_id, player_id, amount, ttype, status="pending"):
+# ============================
+# الرصيد (عمليات ذرية)
+# ============================
+
+# الرصيد والقيد يُكتبان في طلب find_one_and_update واحد (رحلة واحدة إلى MongoDB)؛
+# المستند يحتفظ بآخر LEDGER_MAX_ENTRIES قيد، والسجل الكامل في transactions
+LEDGER_MAX_ENTRIES = int(os.getenv("LEDGER_MAX_ENTRIES", "50"))
+
+
+def _apply_balance(query, telegram_id, delta, reason, ref):
+    """تعديل الرصيد وتسجيل القيد في طلب واحد - يعيد الرصيد الجديد أو None إذا لم يتطابق الشرط"""
+    now = datetime.utcnow()
+    user = users.find_one_and_update(
+        query,
+        {
+            "$inc": {"balance": delta},
+            "$set": {"updated_at": now},
+            "$push": {
+                "ledger": {
+                    "$each": [{"amount": delta, "reason": reason, "ref": ref, "created_at": now}],
+                    "$slice": -LEDGER_MAX_ENTRIES,
+                }
+            },
+        },
+        projection={"balance": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    invalidate_user(telegram_id)
+    return user["balance"] if user else None
+
+
+def debit_balance(telegram_id, amount, reason, ref=None):
+    """خصم المبلغ فقط إذا كان الرصيد كافياً - None عند عدم كفاية الرصيد"""
+    if not _db_check():
+        return None
+    return _apply_balance(
+        {"telegram_id": telegram_id, "balance": {"$gte": amount}},
+        telegram_id, -amount, reason, ref
+    )
+
+
+def credit_balance(telegram_id, amount, reason, ref=None):
+    """إضافة المبلغ إلى الرصيد - None إذا لم يوجد المستخدم"""
+    if not _db_check():
+        return None
+    return _apply_balance({"telegram_id": telegram_id}, telegram_id, amount, reason, ref)
+
+
+def log_transaction(telegram_id, player_id, amount, ttype, status="pending", **extra):
     if not _db_check():
         return False
 
@@ -135,6 +338,7 @@ def log_transaction(telegram_id, player_id, amount, ttype, status="pending"):
             "amount": amount,
             "status": status,
             "created_at": datetime.utcnow(),
+            **extra,
         }
     )
 
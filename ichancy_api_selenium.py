@@ -12,24 +12,92 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 from datetime import datetime, timedelta
 import random
+from ichancy_http_client import (
+    IChancyHTTPClient, HTTPClientError, ENDPOINTS, SESSION_TTL, shares_prefix
+)
+from players_index import get_players_index
+from wait_engine import Waiter
+from selector_cache import SelectorCache
+from session_lock import LoginLock
+from network_capture import NetworkCapture
+import resource_blocking
+
+# استراتيجية إدخال النص: native (إعداد القيمة مرة واحدة) | cdp (Input.insertText) | type (حرفاً حرفاً)
+INPUT_STRATEGY = os.getenv("ICHANCY_INPUT_STRATEGY", "native")
+
+# الحقول التي يراقب الموقع طريقة كتابتها فتبقى بالكتابة البشرية
+TYPED_FIELDS = {
+    f.strip() for f in os.getenv("ICHANCY_TYPED_FIELDS", "login_username,login_password").split(",") if f.strip()
+}
+
+# إعداد القيمة عبر setter الأصلي حتى تلتقطها أطر العمل (React/Vue) ثم إطلاق الأحداث
+NATIVE_SET_VALUE_JS = """
+var el = arguments[0], value = arguments[1];
+el.focus();
+var proto = el.tagName === 'TEXTAREA' ? HTMLTextAreaElement.prototype : HTMLInputElement.prototype;
+Object.getOwnPropertyDescriptor(proto, 'value').set.call(el, value);
+el.dispatchEvent(new Event('input', {bubbles: true}));
+el.dispatchEvent(new Event('change', {bubbles: true}));
+return el.value === value;
+"""
+
+# مدة الثقة بالجلسة بعد آخر عملية ناجحة دون أي فحص
+SESSION_TRUST_SECONDS = int(os.getenv("ICHANCY_SESSION_TRUST_SECONDS", "60"))
+
+# طلب fetch خفيف من داخل الصفحة إلى واجهة تتطلب تسجيل الدخول
+LIVENESS_PROBE_JS = """
+var url = arguments[0], done = arguments[arguments.length - 1];
+fetch(url, {
+    method: 'POST',
+    credentials: 'include',
+    headers: {'Content-Type': 'application/json', 'Accept': 'application/json'},
+    body: JSON.stringify({start: 0, limit: 1, filter: {}})
+}).then(function (r) {
+    var type = r.headers.get('content-type') || '';
+    return r.text().then(function (text) {
+        var body = null;
+        try { body = JSON.parse(text); } catch (e) {}
+        done({status: r.status, redirected: r.redirected, type: type,
+              json: body !== null && typeof body === 'object',
+              ok: !!body && typeof body === 'object' && body.status !== false});
+    });
+}).catch(function () { done({status: -1}); });
+"""
 
 class IChancySeleniumAPI:
     """API باستخدام Selenium مجاناً لتجاوز الكابتشا"""
     
-    def __init__(self, headless=True):
+    def __init__(self, headless=True, wait_profile=None, block_policy=None):
         self._setup_logging()
         self._load_config()
         self.driver = None
         self.headless = headless
         self.is_logged_in = False
+        self.last_success_at = 0
         self.redis = None
+        self.wait_profile = wait_profile
+        self.block_policy = block_policy or resource_blocking.BLOCK_POLICY
+        self.wait = None
+        self.network = None
         
         # مفاتيح Redis
         self.REDIS_SESSION_KEY = "ichancy:selenium_session"
         self.REDIS_LOCK_KEY = "ichancy:selenium_lock"
         
         self._init_redis()
+        self.selectors = SelectorCache(self.redis)
+        self.login_lock = LoginLock(self.redis, self.REDIS_LOCK_KEY, self.REDIS_SESSION_KEY)
+        self._fence_token = None
         self._init_driver()
+        
+        # عميل HTTP سريع يستخدم نفس الكوكيز، والمتصفح فقط لتسجيل الدخول
+        self.http = IChancyHTTPClient(
+            self.redis,
+            base_url=self.BASE_URL,
+            parent_id=self.PARENT_ID,
+            relogin=self._relogin_for_http
+        )
+        self.players_index = get_players_index(self.redis)
     
     def _setup_logging(self):
         logging.basicConfig(
@@ -114,12 +182,18 @@ class IChancySeleniumAPI:
             options.add_experimental_option("excludeSwitches", ["enable-automation"])
             options.add_experimental_option('useAutomationExtension', False)
             
+            # سجلات الشبكة لالتقاط استجابات JSON (مثل معرف اللاعب الجديد)
+            options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+            
             # إنشاء Driver
             self.driver = uc.Chrome(
                 options=options,
                 version_main=120  # استخدام إصدار Chrome 120
             )
             
+            # حظر الخطوط والتتبع قبل أول تنقل؛ الصور وCSS تُحظر بعد تسجيل الدخول فقط
+            resource_blocking.apply(self.driver, self.block_policy, stage="login")
+            
             # تنفيذ scripts للتخفي
             self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
             self.driver.execute_script(
@@ -137,7 +211,12 @@ class IChancySeleniumAPI:
                 """
             )
             
-            self.logger.info("✅ تم تهيئة متصفح Selenium بنجاح")
+            # طبقة الانتظار على الشروط
+            self.wait = Waiter(self.driver, self.wait_profile)
+            self.wait.install()
+            self.network = NetworkCapture(self.driver)
+            
+            self.logger.info(f"✅ تم تهيئة متصفح Selenium بنجاح (ملف الانتظار: {self.wait.profile})")
             
         except Exception as e:
             self.logger.error(f"❌ فشل تهيئة المتصفح: {e}")
@@ -149,31 +228,70 @@ class IChancySeleniumAPI:
             element = WebDriverWait(self.driver, timeout).until(
                 EC.element_to_be_clickable((by, value))
             )
-            time.sleep(random.uniform(0.5, 1.5))  # تأخير بشري
+            self.wait.humanize("click")  # تأخير بشري
             element.click()
             return True
         except TimeoutException:
             self.logger.warning(f"⏳ انتهى الوقت للعنصر: {value}")
             return False
     
-    def _wait_and_send_keys(self, by, value, text, timeout=10):
+    def _input_strategy(self, field):
+        """اختيار طريقة الإدخال للحقل"""
+        if field in TYPED_FIELDS:
+            return "type"
+        return INPUT_STRATEGY
+    
+    def _type_text(self, element, text):
+        """محاكاة الكتابة البشرية"""
+        for char in text:
+            element.send_keys(char)
+            self.wait.humanize("keystroke")
+    
+    def _wait_and_send_keys(self, by, value, text, timeout=10, field=None):
         """انتظار عنصر وإدخال نص"""
         try:
             element = WebDriverWait(self.driver, timeout).until(
                 EC.presence_of_element_located((by, value))
             )
-            time.sleep(random.uniform(0.3, 0.8))  # تأخير بشري
-            
-            # محاكاة الكتابة البشرية
-            for char in text:
-                element.send_keys(char)
-                time.sleep(random.uniform(0.05, 0.15))
+            self.wait.humanize("before_type")  # تأخير بشري
+            
+            strategy = self._input_strategy(field)
+            if strategy == "native":
+                if not self.driver.execute_script(NATIVE_SET_VALUE_JS, element, text):
+                    self.logger.debug(f"native input rejected for {value}, typing instead")
+                    element.clear()
+                    self._type_text(element, text)
+            elif strategy == "cdp":
+                self.driver.execute_script("arguments[0].focus();", element)
+                self.driver.execute_cdp_cmd("Input.insertText", {"text": text})
+            else:
+                self._type_text(element, text)
             
             return True
         except TimeoutException:
             self.logger.warning(f"⏳ انتهى الوقت لإدخال النص في: {value}")
             return False
     
+    def _fill_first(self, field, selectors, text, timeout=10):
+        """إدخال النص في أول محدد ناجح (الأنجح سابقاً أولاً)"""
+        for selector in self.selectors.order(field, selectors):
+            by, value = selector
+            if self._wait_and_send_keys(by, value, text, timeout=timeout, field=field):
+                self.selectors.hit(field, selector)
+                return True
+            self.selectors.miss(field, selector)
+        return False
+    
+    def _click_first(self, field, selectors, timeout=10):
+        """النقر على أول محدد ناجح (الأنجح سابقاً أولاً)"""
+        for selector in self.selectors.order(field, selectors):
+            by, value = selector
+            if self._wait_and_click(by, value, timeout=timeout):
+                self.selectors.hit(field, selector)
+                return True
+            self.selectors.miss(field, selector)
+        return False
+    
     def _is_element_present(self, by, value, timeout=5):
         """التحقق من وجود عنصر"""
         try:
@@ -189,10 +307,14 @@ class IChancySeleniumAPI:
         try:
             self.logger.info("🚀 بدء تسجيل الدخول...")
             
+            # صفحة الدخول قد تعرض كابتشا: لا حظر للصور أثناءها
+            resource_blocking.apply(self.driver, self.block_policy, stage="login")
+            
             # الانتقال إلى صفحة تسجيل الدخول
             login_url = f"{self.BASE_URL}/dashboard"
             self.driver.get(login_url)
-            time.sleep(random.uniform(3, 5))
+            self.wait.settle()
+            self.wait.humanize("after_load")
             
             # التحقق من وجود حقول تسجيل الدخول
             username_selectors = [
@@ -210,28 +332,20 @@ class IChancySeleniumAPI:
             ]
             
             # البحث عن حقل اسم المستخدم
-            username_found = False
-            for by, value in username_selectors:
-                if self._wait_and_send_keys(by, value, self.USERNAME, timeout=15):
-                    username_found = True
-                    break
+            username_found = self._fill_first("login_username", username_selectors, self.USERNAME, timeout=15)
             
             if not username_found:
                 raise Exception("لم يتم العثور على حقل اسم المستخدم")
             
-            time.sleep(random.uniform(1, 2))
+            self.wait.humanize("between_fields")
             
             # البحث عن حقل كلمة المرور
-            password_found = False
-            for by, value in password_selectors:
-                if self._wait_and_send_keys(by, value, self.PASSWORD, timeout=15):
-                    password_found = True
-                    break
+            password_found = self._fill_first("login_password", password_selectors, self.PASSWORD, timeout=15)
             
             if not password_found:
                 raise Exception("لم يتم العثور على حقل كلمة المرور")
             
-            time.sleep(random.uniform(1, 2))
+            self.wait.humanize("between_fields")
             
             # البحث عن زر تسجيل الدخول
             login_button_selectors = [
@@ -242,24 +356,40 @@ class IChancySeleniumAPI:
                 (By.XPATH, "//input[@type='submit']")
             ]
             
-            login_success = False
-            for by, value in login_button_selectors:
-                if self._wait_and_click(by, value, timeout=15):
-                    login_success = True
-                    break
+            # ما تبقى (الإرسال وإعادة التوجيه) قد يستغرق حتى 65ث: نجدد القفل قبله
+            self.login_lock.extend(self._fence_token)
+            
+            before_url = self.driver.current_url
+            mark = self.network.mark()
+            login_success = self._click_first("login_button", login_button_selectors, timeout=15)
             
             if not login_success:
                 # محاولة النقر باستخدام JavaScript
                 self.driver.execute_script("document.querySelector('button[type=\"submit\"]').click();")
             
-            # انتظار تحميل الصفحة التالية
-            time.sleep(random.uniform(5, 8))
+            # رد واجهة تسجيل الدخول يحسم الفشل مباشرة دون انتظار إعادة التوجيه
+            sign_in = self.network.wait_for(ENDPOINTS["sign_in"], since=mark, timeout=15)
+            if sign_in and not sign_in.ok:
+                error_text = sign_in.error_message("فشل تسجيل الدخول")
+                self.logger.error(f"❌ خطأ في تسجيل الدخول: {error_text}")
+                return False, {"error": error_text}
+            
+            # انتظار الانتقال من صفحة الدخول (تغير URL أو اختفاء حقل كلمة المرور)
+            self.wait.until(
+                lambda d: d.current_url != before_url
+                or not d.find_elements(By.CSS_SELECTOR, "input[type='password']"),
+                timeout=20,
+                label="login_redirect"
+            )
+            self.wait.settle()
             
             # التحقق من نجاح تسجيل الدخول
             current_url = self.driver.current_url
             if "dashboard" in current_url and "login" not in current_url:
                 self.is_logged_in = True
+                self.last_success_at = time.time()
                 self.logger.info("✅ تم تسجيل الدخول بنجاح")
+                resource_blocking.apply(self.driver, self.block_policy)
                 
                 # حفظ الكوكيز في Redis
                 self._save_cookies()
@@ -303,16 +433,19 @@ class IChancySeleniumAPI:
         """حفظ الكوكيز في Redis"""
         try:
             cookies = self.driver.get_cookies()
-            self.redis.setex(
-                self.REDIS_SESSION_KEY,
-                1800,  # 30 دقيقة
+            saved = self.login_lock.save_session(
+                self._fence_token,
                 json.dumps({
                     "cookies": cookies,
                     "timestamp": datetime.now().isoformat(),
-                    "url": self.driver.current_url
-                })
+                    "url": self.driver.current_url,
+                    "user_agent": self.driver.execute_script("return navigator.userAgent"),
+                    "fence": self._fence_token
+                }),
+                SESSION_TTL  # 30 دقيقة افتراضياً، يمددها session_keepalive
             )
-            self.logger.info("💾 تم حفظ الكوكيز في Redis")
+            if saved:
+                self.logger.info("💾 تم حفظ الكوكيز في Redis")
         except Exception as e:
             self.logger.error(f"❌ فشل حفظ الكوكيز: {e}")
     
@@ -331,7 +464,7 @@ class IChancySeleniumAPI:
             
             # الانتقال إلى الموقع أولاً
             self.driver.get(self.BASE_URL)
-            time.sleep(2)
+            self.wait.page_loaded()
             
             # إضافة الكوكيز
             for cookie in cookies:
@@ -342,12 +475,14 @@ class IChancySeleniumAPI:
             
             # تحديث الصفحة
             self.driver.refresh()
-            time.sleep(3)
+            self.wait.settle()
             
             # التحقق من أننا مسجلين الدخول
             if "dashboard" in self.driver.current_url and "login" not in self.driver.current_url:
                 self.is_logged_in = True
+                self.last_success_at = time.time()
                 self.logger.info("✅ تم استعادة الجلسة من الكوكيز")
+                resource_blocking.apply(self.driver, self.block_policy)
                 return True
             
             return False
@@ -356,38 +491,168 @@ class IChancySeleniumAPI:
             self.logger.error(f"❌ فشل تحميل الكوكيز: {e}")
             return False
     
+    def _probe_session(self):
+        """فحص خفيف للجلسة عبر fetch داخل الصفحة - True/False أو None إذا كانت النتيجة غير حاسمة"""
+        try:
+            # fetch يرسل الكوكيز فقط إذا كانت الصفحة الحالية على نفس الموقع
+            if not self.driver.current_url.startswith(self.BASE_URL):
+                return None
+            self.driver.set_script_timeout(5)
+            status = self.driver.execute_async_script(
+                LIVENESS_PROBE_JS, f"{self.BASE_URL}{ENDPOINTS['players']}"
+            )
+        except Exception as e:
+            self.logger.debug(f"liveness probe failed: {e}")
+            return None
+        
+        status = status or {}
+        code = status.get("status")
+        if code in (401, 403):
+            return False
+        if code != 200:
+            return None
+        # fetch يتبع إعادة التوجيه: صفحة دخول HTML بحالة 200 تعني جلسة منتهية (مثل SessionExpired في عميل HTTP)
+        if status.get("redirected") or "html" in status.get("type", "") or not status.get("json"):
+            return False
+        # JSON بـ status: false غير حاسم (قد يكون خطأ آخر غير الجلسة)
+        return True if status.get("ok") else None
+    
     def ensure_login(self):
         """التأكد من تسجيل الدخول"""
         if self.is_logged_in:
-            # التحقق السريع من أن الجلسة لا تزال نشطة
-            try:
-                self.driver.get(f"{self.BASE_URL}/dashboard")
-                time.sleep(2)
-                if "login" not in self.driver.current_url:
-                    return True
-            except:
-                pass
+            # نجاح حديث (هنا أو عبر عميل HTTP بنفس الكوكيز): لا حاجة لأي فحص
+            last_success = max(self.last_success_at, self.http.last_success_at)
+            if time.time() - last_success < SESSION_TRUST_SECONDS:
+                return True
+            
+            alive = self._probe_session()
+            if alive is None:
+                # الفحص غير حاسم: التحقق بالتنقل إلى لوحة التحكم
+                try:
+                    self.driver.get(f"{self.BASE_URL}/dashboard")
+                    self.wait.page_loaded()
+                    alive = "login" not in self.driver.current_url
+                except:
+                    alive = False
+            
+            if alive:
+                self.last_success_at = time.time()
+                return True
+            
+            self.logger.info("🔄 انتهت الجلسة في المتصفح")
+            self.is_logged_in = False
         
         # محاولة تحميل الجلسة من الكوكيز
         if self._load_cookies():
             return True
         
-        # تسجيل الدخول جديد
-        success, result = self.login()
+        # تسجيل الدخول جديد - عملية واحدة فقط على مستوى كل العمليات
+        stamp = self.login_lock.session_stamp()
+        token = self.login_lock.acquire()
+        
+        if token is None:
+            # عملية أخرى تسجل الدخول الآن: ننتظر كوكيزها بدلاً من تسجيل دخول ثانٍ
+            self.logger.info("⏳ تسجيل الدخول جارٍ في عملية أخرى، انتظار الجلسة...")
+            if self.login_lock.wait_for_session(stamp) and self._load_cookies():
+                return True
+            token = self.login_lock.acquire()
+            if token is None:
+                raise Exception("فشل تسجيل الدخول: انتهت مهلة انتظار الجلسة")
+        
+        self._fence_token = token
+        try:
+            success, result = self.login()
+        finally:
+            self._fence_token = None
+            self.login_lock.release(token)
+        
         if not success:
             raise Exception(f"فشل تسجيل الدخول: {result.get('error', 'غير معروف')}")
         
         return True
     
-    def check_player_exists(self, username):
-        """التحقق من وجود اللاعب"""
+    def _relogin_for_http(self):
+        """تسجيل دخول عبر المتصفح لصالح عميل HTTP"""
+        self.is_logged_in = False
+        try:
+            return self.ensure_login()
+        except Exception as e:
+            self.logger.error(f"❌ فشل تسجيل الدخول لعميل HTTP: {e}")
+            return False
+    
+    def check_player_exists(self, username, remote=False, http_first=True):
+        """التحقق من وجود اللاعب (من الفهرس المحلي ما لم يُطلب تأكيد بعيد)"""
+        if not remote:
+            try:
+                exists = self.players_index.exists(username)
+                if exists is not None:
+                    return exists, {"exists": exists, "source": "index"}
+            except Exception as e:
+                self.logger.warning(f"⚠️ تعذرت قراءة فهرس اللاعبين: {e}")
+        
+        if http_first:
+            try:
+                return self.http.check_player_exists(username)
+            except HTTPClientError as e:
+                self.logger.warning(f"⚠️ فشل التحقق عبر HTTP، الرجوع إلى المتصفح: {e}")
+        
+        return self._check_player_exists_browser(username)
+    
+    def check_players_exist(self, candidates, query=None, http_first=True):
+        """التحقق من عدة أسماء دفعة واحدة - يعيد ({username: exists}, extra)"""
+        candidates = list(candidates)
+        if query is None:
+            query = os.path.commonprefix([c.lower() for c in candidates])
+        
+        try:
+            results = self.players_index.exists_many(candidates)
+            if results is not None:
+                return results, {"source": "index"}
+        except Exception as e:
+            self.logger.warning(f"⚠️ تعذرت قراءة فهرس اللاعبين: {e}")
+        
+        if http_first:
+            try:
+                return self.http.check_players_exist(candidates, query), {"source": "http"}
+            except HTTPClientError as e:
+                self.logger.warning(f"⚠️ فشل التحقق الجماعي عبر HTTP، الرجوع إلى المتصفح: {e}")
+        
+        # بحث واحد يغطي فقط الأسماء التي تبدأ بـ query (انظر IChancyHTTPClient.check_players_exist)
+        covered = [c for c in candidates if shares_prefix(c, query)]
+        results, extra = {}, {"source": "browser"}
+        if covered:
+            results, extra = self._check_players_exist_browser(covered, query)
+            if "error" in extra:
+                return results, extra
+        
+        # الباقي: تحقق منفصل لكل اسم
+        for username in candidates:
+            if username in results:
+                continue
+            exists, single = self._check_player_exists_browser(username)
+            if "error" in single:
+                return results, single
+            results[username] = exists
+        return results, extra
+    
+    def _check_player_exists_browser(self, username):
+        """التحقق من وجود اللاعب عبر صفحة اللاعبين"""
+        results, extra = self._check_players_exist_browser([username], username)
+        if "error" in extra:
+            return False, extra
+        exists = results[username]
+        return exists, {"exists": exists}
+    
+    def _check_players_exist_browser(self, candidates, query):
+        """التحقق من عدة أسماء بزيارة واحدة لصفحة اللاعبين والبحث عن الجزء المشترك"""
         try:
             self.ensure_login()
             
             # الانتقال إلى صفحة اللاعبين
             players_url = f"{self.BASE_URL}/dashboard/players"
             self.driver.get(players_url)
-            time.sleep(random.uniform(4, 6))
+            self.wait.settle()
+            self.wait.humanize("after_load")
             
             # البحث عن حقل البحث
             search_selectors = [
@@ -397,17 +662,14 @@ class IChancySeleniumAPI:
                 (By.NAME, "search")
             ]
             
-            search_found = False
-            for by, value in search_selectors:
-                if self._wait_and_send_keys(by, value, username, timeout=10):
-                    search_found = True
-                    break
+            mark = self.network.mark()
+            search_found = self._fill_first("players_search", search_selectors, query, timeout=10)
             
             if not search_found:
                 self.logger.warning("⚠️ لم يتم العثور على حقل البحث")
-                return False, {"error": "لم يتم العثور على حقل البحث"}
+                return {}, {"error": "لم يتم العثور على حقل البحث"}
             
-            time.sleep(random.uniform(2, 4))
+            self.wait.xhr_idle()
             
             # النقر على زر البحث أو انتظار النتائج
             search_button_selectors = [
@@ -416,61 +678,90 @@ class IChancySeleniumAPI:
                 (By.CSS_SELECTOR, "button[type='submit']")
             ]
             
-            for by, value in search_button_selectors:
-                if self._wait_and_click(by, value, timeout=5):
-                    time.sleep(random.uniform(3, 5))
-                    break
+            if self._click_first("players_search_button", search_button_selectors, timeout=5):
+                self.wait.xhr_idle()
+            
+            # نتيجة البحث من استجابة الواجهة مباشرة (آخر بحث بعد كتابة الاسم)
+            search = self.network.wait_for(ENDPOINTS["players"], since=mark, timeout=5, latest=True)
+            if search and search.ok and isinstance(search.data["result"], dict):
+                found = {
+                    str(r.get("username", "")).lower()
+                    for r in search.data["result"].get("records", [])
+                }
+                results = {username: username.lower() in found for username in candidates}
+                self.logger.info(f"🔎 نتيجة البحث من الشبكة: {results}")
+                return results, {"source": "network"}
             
             # البحث عن النتائج في الجدول
             try:
                 # انتظار تحميل الجدول
-                time.sleep(random.uniform(3, 5))
+                self.wait.rows_rendered()
                 
-                # البحث عن اسم المستخدم في الصفحة
-                page_source = self.driver.page_source
-                
-                # طريقة 1: البحث في نص الصفحة
-                if username.lower() in page_source.lower():
-                    self.logger.info(f"✅ اللاعب '{username}' موجود")
-                    return True, {"exists": True}
-                
-                # طريقة 2: البحث في الجداول
-                table_selectors = [
-                    (By.TAG_NAME, "table"),
-                    (By.CLASS_NAME, "table"),
-                    (By.XPATH, "//table")
-                ]
-                
-                for by, value in table_selectors:
+                # قراءة الصفحة والجداول مرة واحدة لكل الأسماء
+                page_text = self.driver.page_source.lower()
+                tables_text = ""
+                for table in self.driver.find_elements(By.TAG_NAME, "table"):
                     try:
-                        tables = self.driver.find_elements(by, value)
-                        for table in tables:
-                            if username in table.text:
-                                self.logger.info(f"✅ اللاعب '{username}' موجود في الجدول")
-                                return True, {"exists": True}
+                        tables_text += table.text + "\n"
                     except:
                         continue
                 
-                self.logger.info(f"ℹ️ اللاعب '{username}' غير موجود")
-                return False, {"exists": False}
+                results = {}
+                for username in candidates:
+                    # طريقة 1: نص الصفحة - طريقة 2: نص الجداول
+                    exists = username.lower() in page_text or username in tables_text
+                    results[username] = exists
+                    if exists:
+                        self.logger.info(f"✅ اللاعب '{username}' موجود")
+                    else:
+                        self.logger.info(f"ℹ️ اللاعب '{username}' غير موجود")
+                
+                return results, {"source": "browser"}
                 
             except Exception as e:
                 self.logger.error(f"❌ خطأ في البحث: {e}")
-                return False, {"error": str(e)}
+                return {}, {"error": str(e)}
                 
         except Exception as e:
             self.logger.error(f"❌ استثناء في التحقق من اللاعب: {e}")
-            return False, {"error": str(e)}
+            return {}, {"error": str(e)}
+    
+    def _report(self, progress, stage):
+        """إبلاغ المستدعي بالمرحلة الحالية (progress اختياري)"""
+        if progress:
+            try:
+                progress(stage)
+            except Exception as e:
+                self.logger.debug(f"progress callback error: {e}")
+    
+    def create_player(self, username, password, progress=None):
+        """إنشاء لاعب جديد عبر المتصفح - progress(stage) يُستدعى عند كل مرحلة
+
+        مسار HTTP أولاً والتحقق من الوجود عند نتيجة غير معروفة في IChancySession.create_player فقط.
+        """
+        status, data, player_id = self._create_player_browser(username, password, progress)
+        
+        if status == 200:
+            try:
+                self.players_index.add(username, player_id)
+            except Exception as e:
+                self.logger.warning(f"⚠️ تعذر تحديث فهرس اللاعبين: {e}")
+        
+        return status, data, player_id
     
-    def create_player(self, username, password):
-        """إنشاء لاعب جديد"""
+    def _create_player_browser(self, username, password, progress=None):
+        """إنشاء لاعب جديد عبر نموذج لوحة التحكم"""
         try:
+            self._report(progress, "login")
             self.ensure_login()
             
             # الانتقال إلى صفحة إنشاء لاعب جديد
             create_url = f"{self.BASE_URL}/dashboard/players/create"
             self.driver.get(create_url)
-            time.sleep(random.uniform(4, 6))
+            self.wait.settle()
+            self.wait.humanize("after_load")
+            
+            self._report(progress, "form")
             
             # حقل اسم المستخدم
             username_selectors = [
@@ -482,16 +773,12 @@ class IChancySeleniumAPI:
                 (By.XPATH, "//input[@placeholder='Login']")
             ]
             
-            username_filled = False
-            for by, value in username_selectors:
-                if self._wait_and_send_keys(by, value, username, timeout=10):
-                    username_filled = True
-                    break
+            username_filled = self._fill_first("player_username", username_selectors, username, timeout=10)
             
             if not username_filled:
                 raise Exception("لم يتم العثور على حقل اسم المستخدم")
             
-            time.sleep(random.uniform(1, 2))
+            self.wait.humanize("between_fields")
             
             # حقل كلمة المرور
             password_selectors = [
@@ -500,16 +787,12 @@ class IChancySeleniumAPI:
                 (By.XPATH, "//input[@type='password' and contains(@placeholder, 'password')]")
             ]
             
-            password_filled = False
-            for by, value in password_selectors:
-                if self._wait_and_send_keys(by, value, password, timeout=10):
-                    password_filled = True
-                    break
+            password_filled = self._fill_first("player_password", password_selectors, password, timeout=10)
             
             if not password_filled:
                 raise Exception("لم يتم العثور على حقل كلمة المرور")
             
-            time.sleep(random.uniform(1, 2))
+            self.wait.humanize("between_fields")
             
             # حقل تأكيد كلمة المرور
             confirm_selectors = [
@@ -519,11 +802,9 @@ class IChancySeleniumAPI:
                 (By.XPATH, "//input[@placeholder='Confirm Password']")
             ]
             
-            for by, value in confirm_selectors:
-                if self._wait_and_send_keys(by, value, password, timeout=5):
-                    break
+            self._fill_first("player_confirm_password", confirm_selectors, password, timeout=5)
             
-            time.sleep(random.uniform(1, 2))
+            self.wait.humanize("between_fields")
             
             # حقل البريد الإلكتروني
             email = f"{username}@player.ichancy.com"
@@ -533,13 +814,12 @@ class IChancySeleniumAPI:
                 (By.XPATH, "//input[@type='email']")
             ]
             
-            for by, value in email_selectors:
-                if self._wait_and_send_keys(by, value, email, timeout=5):
-                    break
+            self._fill_first("player_email", email_selectors, email, timeout=5)
             
-            time.sleep(random.uniform(1, 2))
+            self.wait.humanize("between_fields")
             
             # النقر على زر الإنشاء
+            self._report(progress, "submit")
             create_button_selectors = [
                 (By.XPATH, "//button[contains(text(), 'Create')]"),
                 (By.XPATH, "//button[contains(text(), 'Save')]"),
@@ -547,11 +827,8 @@ class IChancySeleniumAPI:
                 (By.CSS_SELECTOR, "button[type='submit']")
             ]
             
-            created = False
-            for by, value in create_button_selectors:
-                if self._wait_and_click(by, value, timeout=10):
-                    created = True
-                    break
+            mark = self.network.mark()
+            created = self._click_first("create_button", create_button_selectors, timeout=10)
             
             if not created:
                 # محاولة باستخدام JavaScript
@@ -565,8 +842,29 @@ class IChancySeleniumAPI:
                     }
                 """)
             
-            # انتظار النتيجة
-            time.sleep(random.uniform(5, 8))
+            # انتظار رد واجهة الإنشاء: نتيجة محددة دون تحليل الصفحة
+            register = self.network.wait_for(ENDPOINTS["register"], since=mark, timeout=20)
+            if register:
+                if register.ok:
+                    self.logger.info(f"✅ تم إنشاء اللاعب '{username}' بنجاح")
+                    self._report(progress, "player_id")
+                    return 200, {
+                        "status": True,
+                        "message": "تم إنشاء اللاعب بنجاح",
+                        "username": username,
+                        "email": email
+                    }, self._extract_player_id(username, register.data)
+                
+                error_msg = register.error_message("فشل إنشاء الحساب")
+                self.logger.error(f"❌ {error_msg}")
+                return 400, {
+                    "status": False,
+                    "error": error_msg
+                }, None
+            
+            # لم نلتقط الرد: الرجوع إلى فحص محتوى الصفحة
+            self.wait.xhr_idle(timeout=5)
+            self.wait.humanize("after_load")
             
             # التحقق من نجاح الإنشاء
             success_indicators = [
@@ -582,6 +880,7 @@ class IChancySeleniumAPI:
                     self.logger.info(f"✅ تم إنشاء اللاعب '{username}' بنجاح")
                     
                     # محاولة الحصول على معرف اللاعب
+                    self._report(progress, "player_id")
                     player_id = self._extract_player_id(username)
                     
                     return 200, {
@@ -613,6 +912,7 @@ class IChancySeleniumAPI:
             current_url = self.driver.current_url
             if "create" not in current_url and "players" in current_url:
                 # ربما نجحت العملية
+                self._report(progress, "player_id")
                 player_id = self._extract_player_id(username)
                 return 200, {
                     "status": True,
@@ -644,38 +944,51 @@ class IChancySeleniumAPI:
                 "error": str(e)
             }, None
     
-    def _extract_player_id(self, username):
-        """استخراج معرف اللاعب"""
+    def _extract_player_id(self, username, register_response=None):
+        """معرف اللاعب من استجابة الإنشاء الملتقطة، أو ببحث HTTP واحد - None إذا تعذر"""
+        result = (register_response or {}).get("result")
+        if isinstance(result, dict) and result.get("playerId"):
+            return str(result["playerId"])
+        
         try:
-            # الانتقال إلى صفحة اللاعبين والبحث عن المعرف
-            players_url = f"{self.BASE_URL}/dashboard/players"
-            self.driver.get(players_url)
-            time.sleep(4)
-            
-            # البحث عن اللاعب في الجدول
-            try:
-                # البحث عن الصف الذي يحتوي على اسم المستخدم
-                rows = self.driver.find_elements(By.XPATH, "//tr")
-                for row in rows:
-                    if username in row.text:
-                        # محاولة استخراج المعرف من الصف
-                        cells = row.find_elements(By.TAG_NAME, "td")
-                        for cell in cells:
-                            text = cell.text.strip()
-                            # البحث عن معرف (عادة يبدأ بـ P أو رقم)
-                            if text.startswith("P") or text.isdigit():
-                                return text
-            except:
-                pass
-            
-            # إذا لم نجد، نستخدم معرف مؤقت
-            return f"P{int(time.time())}"
-            
-        except:
+            _, data = self.http.check_player_exists(username)
+            return data.get("player_id")
+        except HTTPClientError as e:
+            self.logger.warning(f"⚠️ تعذر الحصول على معرف اللاعب '{username}': {e}")
+            return None
+    
+    def browser_rss_mb(self):
+        """ذاكرة Chrome الفعلية (المتصفح وكل عملياته الفرعية) بالميغابايت من /proc"""
+        pid = getattr(self.driver, "browser_pid", None)
+        if not pid:
             return None
+        
+        children = {}
+        rss_pages = {}
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    # الحقل الرابع بعد اسم العملية (بين أقواس) هو ppid
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+                with open(f"/proc/{entry}/statm") as f:
+                    rss_pages[int(entry)] = int(f.read().split()[1])
+            except (OSError, ValueError, IndexError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+        
+        total, stack = 0, [pid]
+        while stack:
+            current = stack.pop()
+            total += rss_pages.get(current, 0)
+            stack.extend(children.get(current, []))
+        return round(total * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
     
     def close(self):
         """إغلاق المتصفح"""
+        if getattr(self, "http", None):
+            self.http.close()
         if self.driver:
             try:
                 self.driver.quit()
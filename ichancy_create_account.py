@@ -4,8 +4,11 @@ import random
 import string
 import time
 import logging
+import threading
 import db
-from ichancy_api_selenium import IChancySeleniumAPI
+import selenium_jobs
+from session_manager import ensure_session
+from job_queue import JobQueue, QueueFull
 
 # إعدادات التسجيل
 logging.basicConfig(
@@ -14,24 +17,19 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# API instance
-api = None
+# طابور إنشاء الحسابات (يُنشأ عند أول استخدام)
+create_queue = None
+_create_queue_lock = threading.Lock()
 
-def get_api():
-    """الحصول على نسخة من API"""
-    global api
-    if api is None:
-        logger.info("🚀 تهيئة IChancy API...")
-        api = IChancySeleniumAPI(headless=True)
-        try:
-            success, _ = api.login()
-            if success:
-                logger.info("✅ تم تسجيل الدخول إلى API")
-            else:
-                logger.warning("⚠️ فشل تسجيل الدخول التلقائي")
-        except Exception as e:
-            logger.error(f"❌ خطأ في تهيئة API: {e}")
-    return api
+# رسائل مراحل التقدم
+PROGRESS_STAGES = {
+    "queued": "🕐 في الطابور",
+    "check": "🔍 التحقق من الاسم",
+    "login": "🔐 تسجيل الدخول",
+    "form": "📝 تعبئة النموذج",
+    "submit": "📤 إرسال الطلب",
+    "player_id": "🆔 استخراج معرف اللاعب",
+}
 
 def generate_username(raw_username: str) -> str:
     """إنشاء اسم مستخدم فريد"""
@@ -42,36 +40,31 @@ def generate_username(raw_username: str) -> str:
     if len(clean_name) < 3:
         clean_name = clean_name + str(random.randint(100, 999))
     
-    # اقتراحات أسماء
-    prefixes = ['PLAYER', 'USER', 'AGENT', 'GAMER']
+    # اقتراحات أسماء: كلها تبدأ بـ "{clean_name}_" حتى يغطيها بحث واحد بالبادئة
+    suffixes = ['PLAYER', 'USER', 'AGENT', 'GAMER']
     timestamp = int(time.time()) % 10000
     
     attempts = [
         f"{clean_name}_{timestamp:04d}",
-        f"{random.choice(prefixes)}_{clean_name}",
+        f"{clean_name}_{random.choice(suffixes)}",
         f"{clean_name}_{random.randint(1000, 9999)}",
-        f"IC_{clean_name}_{random.randint(100, 999)}"
+        f"{clean_name}_IC{random.randint(100, 999)}"
     ]
     
-    api_instance = get_api()
-    
-    for username in attempts:
-        try:
-            exists, extra_data = api_instance.check_player_exists(username)
-            
-            # تخطي إذا كان هناك خطأ
-            if extra_data and 'error' in extra_data:
-                logger.warning(f"⚠️ خطأ في التحقق من {username}: {extra_data.get('error')}")
-                continue
-                
-            if not exists:
+    try:
+        # التحقق من جميع الاقتراحات دفعة واحدة (بحث واحد عن الاسم المشترك)
+        results, extra_data = ensure_session().check_players_exist(attempts, query=f"{clean_name}_")
+        
+        if extra_data and 'error' in extra_data:
+            logger.warning(f"⚠️ خطأ في التحقق من الأسماء: {extra_data.get('error')}")
+        
+        for username in attempts:
+            if username in results and not results[username]:
                 logger.info(f"✅ اسم متاح: {username}")
                 return username
-                
-        except Exception as e:
-            logger.error(f"❌ استثناء في التحقق من {username}: {str(e)[:100]}")
-            time.sleep(1)
-            continue
+            
+    except Exception as e:
+        logger.error(f"❌ استثناء في التحقق من الأسماء: {str(e)[:100]}")
     
     # إذا فشلت جميع المحاولات
     return f"IC_{clean_name}_{int(time.time())}"
@@ -168,8 +161,27 @@ def validate_password(password):
     
     return True, "✅ كلمة المرور قوية"
 
+def get_create_queue(bot):
+    """الحصول على طابور إنشاء الحسابات"""
+    global create_queue
+    if create_queue is None:
+        with _create_queue_lock:
+            if create_queue is None:
+                create_queue = JobQueue("create_account", lambda job: run_create_account_job(bot, job))
+    return create_queue
+
+def progress_text(stage, position=None, done=()):
+    """نص رسالة الانتظار: المراحل التي حدثت فعلاً (done) ثم المرحلة الحالية"""
+    if stage == "queued":
+        return f"🕐 **تمت إضافة طلبك إلى الطابور**\n\nترتيبك: {position}"
+    
+    # مسار HTTP لا يمر بتسجيل الدخول وتعبئة النموذج، فلا نعرضهما إلا إذا حدثا
+    lines = [f"✅ {PROGRESS_STAGES[key]}" for key in done if key in PROGRESS_STAGES and key != stage]
+    lines.append(f"⏳ {PROGRESS_STAGES.get(stage, stage)}...")
+    return "⏳ **جاري إنشاء الحساب...**\n\n" + "\n".join(lines)
+
 def process_password_step(bot, message, telegram_id, username):
-    """معالجة خطوة كلمة المرور"""
+    """معالجة خطوة كلمة المرور - إضافة المهمة إلى الطابور والعودة فوراً"""
     password = message.text.strip()
     
     # التحقق من قوة كلمة المرور
@@ -178,39 +190,90 @@ def process_password_step(bot, message, telegram_id, username):
         bot.send_message(message.chat.id, validation_msg)
         return
     
-    # إضافة مؤشر الكتابة
-    bot.send_chat_action(message.chat.id, 'typing')
+    # إرسال رسالة الانتظار مع الترتيب المتوقع
+    if selenium_jobs.use_stream():
+        position = selenium_jobs.queue_position()
+    else:
+        jobs = get_create_queue(bot)
+        position = jobs.stats()["pending"] + 1
+    processing_msg = bot.send_message(message.chat.id, progress_text("queued", position))
     
-    # إرسال رسالة الانتظار
-    processing_msg = bot.send_message(
-        message.chat.id,
-        "⏳ **جاري إنشاء الحساب...**\n\n"
-        "قد يستغرق هذا 30-60 ثانية.\n"
-        "يرجى الانتظار..."
-    )
+    job = {
+        "telegram_id": telegram_id,
+        "chat_id": message.chat.id,
+        "message_id": processing_msg.message_id,
+        "username": username,
+        "password": password,
+    }
     
     try:
-        api_instance = get_api()
+        if selenium_jobs.use_stream():
+            # عامل selenium_worker.py سيعدل رسالة الانتظار بنفسه
+            selenium_jobs.submit_job("create", job)
+        else:
+            position = jobs.submit(job)
+    except QueueFull:
+        bot.edit_message_text(
+            "❌ **الخدمة مشغولة حالياً**\n\nيرجى المحاولة مرة أخرى بعد قليل.",
+            chat_id=message.chat.id,
+            message_id=processing_msg.message_id
+        )
+        return
+    
+    logger.info(f"🕐 طلب إنشاء {username} في الطابور، الترتيب {position}")
+
+def _edit_progress(bot, job, stage, position=None):
+    """تحديث رسالة الانتظار (أخطاء التعديل لا توقف المهمة)"""
+    done = job.setdefault("stages", [])
+    text = progress_text(stage, position, done)
+    if stage not in done:
+        done.append(stage)
+    try:
+        bot.edit_message_text(
+            text,
+            chat_id=job["chat_id"],
+            message_id=job["message_id"]
+        )
+    except Exception as e:
+        logger.debug(f"تعذر تحديث رسالة التقدم: {e}")
+
+def run_create_account_job(bot, job):
+    """تنفيذ مهمة إنشاء الحساب في عامل الطابور"""
+    telegram_id = job["telegram_id"]
+    chat_id = job["chat_id"]
+    message_id = job["message_id"]
+    username = job["username"]
+    password = job["password"]
+    
+    try:
+        _edit_progress(bot, job, "check")
+        
+        session = ensure_session()
         
         # التحقق النهائي من وجود اللاعب
         logger.info(f"🔍 التحقق النهائي من: {username}")
-        exists, extra_data = api_instance.check_player_exists(username)
+        exists, extra_data = session.check_player_exists(username, remote=True)
+        
+        # إنشاء الحساب
+        if not exists:
+            logger.info(f"👤 إنشاء حساب: {username}")
+            status, data, player_id = session.create_player(
+                username,
+                password,
+                progress=lambda stage: _edit_progress(bot, job, stage)
+            )
         
         if exists:
             bot.edit_message_text(
                 f"❌ **الاسم مستخدم بالفعل!**\n\n"
                 f"اللاعب `{username}` موجود مسبقاً.\n"
                 f"يرجى اختيار اسم آخر.",
-                chat_id=message.chat.id,
-                message_id=processing_msg.message_id,
+                chat_id=chat_id,
+                message_id=message_id,
                 parse_mode="Markdown"
             )
             return
         
-        # إنشاء الحساب
-        logger.info(f"👤 إنشاء حساب: {username}")
-        status, data, player_id = api_instance.create_player(username, password)
-        
         if status != 200:
             error_msg = data.get('error', 'فشل إنشاء الحساب')
             logger.error(f"❌ فشل إنشاء الحساب: {error_msg}")
@@ -218,8 +281,8 @@ def process_password_step(bot, message, telegram_id, username):
             bot.edit_message_text(
                 f"❌ **فشل إنشاء الحساب:**\n\n{error_msg}\n\n"
                 f"يرجى المحاولة مرة أخرى لاحقاً.",
-                chat_id=message.chat.id,
-                message_id=processing_msg.message_id
+                chat_id=chat_id,
+                message_id=message_id
             )
             return
         
@@ -264,14 +327,14 @@ def process_password_step(bot, message, telegram_id, username):
         # إرسال الرسالة الرئيسية
         bot.edit_message_text(
             success_text,
-            chat_id=message.chat.id,
-            message_id=processing_msg.message_id,
+            chat_id=chat_id,
+            message_id=message_id,
             parse_mode="Markdown"
         )
         
         # إرسال نسخة مبسطة للنسخ
         bot.send_message(
-            message.chat.id,
+            chat_id,
             f"📋 **للنسخ واللصق:**\n\n"
             f"**الموقع:** ichancy.com\n"
             f"**المستخدم:** {username}\n"
@@ -287,6 +350,6 @@ def process_password_step(bot, message, telegram_id, username):
         bot.edit_message_text(
             f"❌ **حدث خطأ غير متوقع:**\n\n{str(e)}\n\n"
             f"يرجى المحاولة مرة أخرى لاحقاً أو التواصل مع الدعم.",
-            chat_id=message.chat.id,
-            message_id=processing_msg.message_id
+            chat_id=chat_id,
+            message_id=message_id
         )
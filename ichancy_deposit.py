@@ -1,6 +1,9 @@
 import db
+import logging
 from session_manager import ensure_session
 
+logger = logging.getLogger(__name__)
+
 pending_deposits = {}
 
 
@@ -32,19 +35,16 @@ def process_amount(bot, message, telegram_id):
         bot.send_message(message.chat.id, "❌ أدخل رقمًا صحيحًا")
         return
 
-    user = db.get_user(telegram_id)
-    balance = user.get("balance", 0)
+    player_id = pending_deposits[telegram_id]["player_id"]
 
-    if balance < amount:
-        bot.send_message(message.chat.id, f"❌ رصيدك غير كافٍ\nرصيدك الحالي: {balance}")
+    # خصم مبدئي ذري: يفشل إذا لم يكن الرصيد كافياً
+    new_balance = db.debit_balance(telegram_id, amount, "ichancy_deposit", ref=player_id)
+    if new_balance is None:
+        user = db.get_user(telegram_id) or {}
+        bot.send_message(message.chat.id, f"❌ رصيدك غير كافٍ\nرصيدك الحالي: {user.get('balance', 0)}")
         pending_deposits.pop(telegram_id, None)
         return
 
-    player_id = pending_deposits[telegram_id]["player_id"]
-
-    # خصم مبدئي
-    db.update_user(telegram_id, {"balance": balance - amount})
-
     # شحن iChancy
     try:
         api = ensure_session()   # ← الجلسة تُستدعى هنا فقط
@@ -52,26 +52,58 @@ def process_amount(bot, message, telegram_id):
     except Exception as e:
         status, data = 500, {"notification": [{"content": str(e)}]}
 
-    if status == 200 and data.get("result", False):
+    if data.get("unknown_outcome"):
+        # ربما تم الشحن: لا نعيد الرصيد ولا نكرر الطلب، تُراجع يدوياً
         db.log_transaction(
             telegram_id=telegram_id,
             player_id=player_id,
             amount=amount,
             ttype="ichancy_deposit",
-            status="completed"
+            status="unknown",
+            error_msg=data.get("error")
         )
-        bot.send_message(message.chat.id, f"✅ تم شحن {amount} بنجاح في حساب iChancy")
-    else:
-        # rollback
-        db.update_user(telegram_id, {"balance": balance})
-        error_msg = data.get("notification", [{}])[0].get("content", "فشل غير معروف")
+        bot.send_message(
+            message.chat.id,
+            "⏳ لم نتمكن من تأكيد نتيجة الشحن.\n\n"
+            "لم يُعد الرصيد بعد، وستتم مراجعة العملية من الإدارة."
+        )
+    elif status == 200 and data.get("result", False):
         db.log_transaction(
             telegram_id=telegram_id,
             player_id=player_id,
             amount=amount,
             ttype="ichancy_deposit",
-            status="failed"
+            status="completed"
         )
-        bot.send_message(message.chat.id, f"❌ فشل الشحن:\n{error_msg}\n\n🔄 تم إعادة الرصيد")
+        bot.send_message(message.chat.id, f"✅ تم شحن {amount} بنجاح في حساب iChancy")
+    else:
+        # rollback
+        refunded = db.credit_balance(telegram_id, amount, "ichancy_deposit_refund", ref=player_id)
+        error_msg = data.get("notification", [{}])[0].get("content", "فشل غير معروف")
+        if refunded is None:
+            # الرصيد خُصم ولم يُعد: يجب أن تتم التسوية يدوياً
+            logger.critical(f"🚨 فشل إعادة رصيد شحن {amount} للمستخدم {telegram_id} (اللاعب {player_id}) - يحتاج تسوية")
+            db.log_transaction(
+                telegram_id=telegram_id,
+                player_id=player_id,
+                amount=amount,
+                ttype="ichancy_deposit",
+                status="reconcile",
+                error_msg=error_msg
+            )
+            bot.send_message(
+                message.chat.id,
+                f"❌ فشل الشحن:\n{error_msg}\n\n"
+                "⚠️ تعذرت إعادة الرصيد تلقائياً، وستتم إعادته من الإدارة."
+            )
+        else:
+            db.log_transaction(
+                telegram_id=telegram_id,
+                player_id=player_id,
+                amount=amount,
+                ttype="ichancy_deposit",
+                status="failed"
+            )
+            bot.send_message(message.chat.id, f"❌ فشل الشحن:\n{error_msg}\n\n🔄 تم إعادة الرصيد")
 
     pending_deposits.pop(telegram_id, None)
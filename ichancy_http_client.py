@@ -0,0 +1,277 @@
+# ichancy_http_client.py - عميل HTTP مباشر للوحة الوكيل باستخدام كوكيز Selenium
+import os
+import json
+import time
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# الإعدادات
+# =========================
+REDIS_SESSION_KEY = "ichancy:selenium_session"
+SESSION_TTL = int(os.getenv("ICHANCY_SESSION_TTL", "1800"))
+HTTP_POOL_SIZE = int(os.getenv("ICHANCY_HTTP_POOL_SIZE", "10"))
+HTTP_TIMEOUT = float(os.getenv("ICHANCY_HTTP_TIMEOUT", "15"))
+CURRENCY = os.getenv("ICHANCY_CURRENCY", "NSP")
+
+# نقاط JSON في لوحة الوكيل
+ENDPOINTS = {
+    "sign_in": "/global/api/User/signIn",
+    "players": "/global/api/Player/getPlayersForCurrentAgent",
+    "register": "/global/api/Player/registerPlayer",
+    "balance": "/global/api/Player/getPlayerBalanceById",
+    "deposit": "/global/api/Player/depositToPlayer",
+    "withdraw": "/global/api/Player/withdrawFromPlayer",
+}
+
+# قراءات فقط: يجوز إعادة إرسالها تلقائياً. الإنشاء والتحويلات لا تُعاد أبداً
+IDEMPOTENT_ENDPOINTS = {"players", "balance"}
+
+
+class HTTPClientError(Exception):
+    """فشل على مستوى النقل أو الجلسة - يجب الرجوع إلى Selenium"""
+
+
+class SessionExpired(HTTPClientError):
+    """الكوكيز غير صالحة أو غير موجودة (الطلب رُفض أو لم يُرسل - آمن للإعادة)"""
+
+
+class RequestNotSent(HTTPClientError):
+    """فشل الاتصال قبل إرسال الطلب - آمن للإعادة"""
+
+
+class UnknownOutcome(HTTPClientError):
+    """طلب كتابة ربما نُفذ على الخادم دون أن نعرف النتيجة - لا يُعاد، يحتاج مطابقة"""
+
+
+def shares_prefix(candidate, query):
+    """هل يظهر الاسم حتماً في نتائج البحث عن query؟ (الاسم يبدأ بها)"""
+    return bool(query) and candidate.lower().startswith(query.lower())
+
+
+class IChancyHTTPClient:
+    """يعيد استخدام كوكيز Selenium المحفوظة في Redis لاستدعاء واجهات JSON مباشرة"""
+
+    def __init__(self, redis_client, base_url=None, parent_id=None, relogin=None):
+        self.redis = redis_client
+        self.BASE_URL = base_url or os.getenv("ICHANCY_ORIGIN", "https://agents.ichancy.com")
+        self.PARENT_ID = parent_id or os.getenv("PARENT_ID")
+        # دالة تسجيل دخول عبر المتصفح تُستدعى عند انتهاء الجلسة فقط
+        self.relogin = relogin
+        self._session_stamp = None
+        # آخر استجابة JSON ناجحة (دليل على أن الكوكيز صالحة)
+        self.last_success_at = 0
+
+        self.session = requests.Session()
+        # بدون إعادة تلقائية افتراضياً (الإنشاء والتحويلات)
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=HTTP_POOL_SIZE, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # إعادة المحاولة فقط لنقاط القراءة (requests يختار أطول بادئة مطابقة)
+        retry = Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504], allowed_methods=None)
+        read_adapter = HTTPAdapter(pool_connections=2, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+        for endpoint in IDEMPOTENT_ENDPOINTS:
+            self.session.mount(f"{self.BASE_URL}{ENDPOINTS[endpoint]}", read_adapter)
+        self.session.headers.update({
+            "Accept": "application/json, text/plain, */*",
+            "Content-Type": "application/json",
+            "Origin": self.BASE_URL,
+            "Referer": f"{self.BASE_URL}/dashboard",
+        })
+
+    # =========================
+    # الكوكيز
+    # =========================
+    def _sync_cookies(self, force=False):
+        """تحميل كوكيز Selenium من Redis إذا تغيرت منذ آخر تحميل"""
+        data = self.redis.get(REDIS_SESSION_KEY)
+        if not data:
+            raise SessionExpired("لا توجد جلسة محفوظة في Redis")
+
+        session_data = json.loads(data)
+        stamp = session_data.get("timestamp")
+        if stamp == self._session_stamp and not force:
+            return
+
+        self.session.cookies.clear()
+        for cookie in session_data.get("cookies", []):
+            self.session.cookies.set(
+                cookie["name"],
+                cookie["value"],
+                domain=cookie.get("domain"),
+                path=cookie.get("path", "/"),
+            )
+
+        # بعض الحمايات تربط الكوكيز بنفس User-Agent
+        if session_data.get("user_agent"):
+            self.session.headers["User-Agent"] = session_data["user_agent"]
+
+        self._session_stamp = stamp
+        logger.info("🍪 تم تحميل كوكيز الجلسة في عميل HTTP")
+
+    def _refresh_session(self):
+        """تسجيل دخول عبر Selenium ثم إعادة تحميل الكوكيز"""
+        if not self.relogin:
+            raise SessionExpired("انتهت الجلسة ولا يوجد تسجيل دخول احتياطي")
+        logger.info("🔐 انتهت جلسة HTTP، تسجيل الدخول عبر المتصفح...")
+        if not self.relogin():
+            raise SessionExpired("فشل تسجيل الدخول الاحتياطي")
+        self._sync_cookies(force=True)
+
+    # =========================
+    # الطلبات
+    # =========================
+    def _request(self, endpoint, payload):
+        idempotent = endpoint in IDEMPOTENT_ENDPOINTS
+        self._sync_cookies()
+        try:
+            response = self.session.post(
+                f"{self.BASE_URL}{ENDPOINTS[endpoint]}",
+                json=payload,
+                timeout=HTTP_TIMEOUT,
+            )
+        except requests.exceptions.ConnectTimeout as e:
+            raise RequestNotSent(f"تعذر الاتصال: {e}")
+        except requests.RequestException as e:
+            if idempotent:
+                raise HTTPClientError(f"خطأ في الاتصال: {e}")
+            # انقطاع بعد الإرسال: ربما نُفذ الطلب
+            raise UnknownOutcome(f"نتيجة غير معروفة لـ {endpoint}: {e}")
+
+        if response.status_code in (401, 403):
+            raise SessionExpired(f"HTTP {response.status_code}")
+
+        if response.status_code >= 500 and not idempotent:
+            # البوابة قد تعيد 5xx بعد أن ينفذ الخادم العملية
+            raise UnknownOutcome(f"نتيجة غير معروفة لـ {endpoint}: HTTP {response.status_code}")
+
+        try:
+            data = response.json()
+        except ValueError:
+            if not idempotent:
+                raise UnknownOutcome(f"نتيجة غير معروفة لـ {endpoint}: استجابة غير JSON")
+            # صفحة HTML (تسجيل دخول أو كابتشا) بدلاً من JSON
+            raise SessionExpired("استجابة غير JSON")
+
+        self.last_success_at = time.time()
+        return response.status_code, data
+
+    def _post(self, endpoint, payload):
+        """طلب مع محاولة واحدة إضافية بعد تجديد الجلسة (SessionExpired يعني أن الطلب لم يُنفذ)"""
+        try:
+            return self._request(endpoint, payload)
+        except SessionExpired:
+            self._refresh_session()
+            return self._request(endpoint, payload)
+
+    @staticmethod
+    def _error_message(data, default="فشل غير معروف"):
+        notification = data.get("notification") if isinstance(data, dict) else None
+        if isinstance(notification, list) and notification:
+            return notification[0].get("content", default)
+        return default
+
+    # =========================
+    # اللاعبين
+    # =========================
+    def search_players(self, query, start=0, limit=20):
+        """البحث في لاعبي الوكيل - يعيد قائمة السجلات"""
+        status, data = self._post("players", {
+            "start": start,
+            "limit": limit,
+            "filter": {"login": query} if query else {},
+            "isNextPage": start > 0,
+        })
+        if status != 200 or not data.get("status", True):
+            raise HTTPClientError(self._error_message(data, "فشل البحث عن اللاعبين"))
+
+        result = data.get("result") or {}
+        return result.get("records", []) if isinstance(result, dict) else []
+
+    def check_player_exists(self, username):
+        records = self.search_players(username)
+        match = next((r for r in records if str(r.get("username", "")).lower() == username.lower()), None)
+        if match:
+            return True, {"exists": True, "player_id": str(match.get("playerId", ""))}
+        return False, {"exists": False}
+
+    def check_players_exist(self, candidates, query=None, limit=100):
+        """عدة أسماء ببحث واحد عن الجزء المشترك - يعيد {username: exists}
+
+        نعتمد فقط على أن فلتر login في اللوحة يعيد كل اسم يبدأ بـ query (مطابقة بادئة؛
+        مطابقة "يحتوي" تحقق ذلك أيضاً). الأسماء التي لا تبدأ بـ query تُفحص منفردة.
+        """
+        covered = [c for c in candidates if shares_prefix(c, query)]
+        results = {c: self.check_player_exists(c)[0] for c in candidates if c not in covered}
+        if not covered:
+            return results
+
+        records = self.search_players(query, limit=limit)
+        found = {str(r.get("username", "")).lower() for r in records}
+        batch = {c: c.lower() in found for c in covered}
+
+        # النتائج مقطوعة: الأسماء غير الموجودة غير مؤكدة فنتحقق منها منفردة
+        if len(records) >= limit:
+            for c, exists in batch.items():
+                if not exists:
+                    batch[c] = self.check_player_exists(c)[0]
+        results.update(batch)
+        return {c: results[c] for c in candidates}
+
+    def create_player(self, username, password, email=None):
+        email = email or f"{username}@player.ichancy.com"
+        status, data = self._post("register", {
+            "player": {
+                "email": email,
+                "password": password,
+                "parentId": self.PARENT_ID,
+                "login": username,
+            }
+        })
+
+        if status == 200 and data.get("result"):
+            result = data["result"]
+            player_id = result.get("playerId") if isinstance(result, dict) else None
+            return 200, {
+                "status": True,
+                "message": "تم إنشاء اللاعب بنجاح",
+                "username": username,
+                "email": email,
+            }, player_id and str(player_id)
+
+        return 400, {"status": False, "error": self._error_message(data, "فشل إنشاء الحساب")}, None
+
+    def get_player_balance(self, player_id):
+        status, data = self._post("balance", {"playerId": str(player_id)})
+        result = data.get("result")
+        if status == 200 and isinstance(result, list) and result:
+            return 200, data, float(result[0].get("balance", 0) or 0)
+        return (400 if status == 200 else status), {"error": self._error_message(data)}, 0.0
+
+    # =========================
+    # الرصيد
+    # =========================
+    def _transfer(self, endpoint, player_id, amount):
+        status, data = self._post(endpoint, {
+            "amount": amount,
+            "comment": None,
+            "playerId": str(player_id),
+            "currencyCode": CURRENCY,
+            "currency": CURRENCY,
+            "moneyStatus": 5,
+        })
+        return status, data
+
+    def deposit_to_player(self, player_id, amount):
+        return self._transfer("deposit", player_id, amount)
+
+    def withdraw_from_player(self, player_id, amount):
+        # واجهة السحب تتوقع مبلغاً سالباً
+        return self._transfer("withdraw", player_id, -abs(amount))
+
+    def close(self):
+        self.session.close()
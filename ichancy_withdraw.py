@@ -120,12 +120,42 @@ def process_withdraw(bot, message, telegram_id):
         status, data = api.withdraw_from_player(player_id, amount)
         bot.delete_message(chat_id, processing_msg.message_id)
         
-        if status == 200 and isinstance(data, dict) and data.get("result", False):
-            user = db.get_user(telegram_id)
-            old_balance = user.get("balance", 0)
-            new_balance = old_balance + amount
+        if isinstance(data, dict) and data.get("unknown_outcome"):
+            # ربما تم السحب: لا نضيف الرصيد ولا نكرر الطلب، تُراجع يدوياً
+            bot.send_message(
+                chat_id,
+                "⏳ لم نتمكن من تأكيد نتيجة السحب.\n\n"
+                "ستتم مراجعة العملية من الإدارة وإضافة الرصيد إن تمت."
+            )
+            db.log_transaction(
+                telegram_id=telegram_id,
+                player_id=player_id,
+                amount=amount,
+                ttype="ichancy_withdraw",
+                status="unknown",
+                error_msg=data.get("error")
+            )
+        
+        elif status == 200 and isinstance(data, dict) and data.get("result", False):
+            new_balance = db.credit_balance(telegram_id, amount, "ichancy_withdraw", ref=player_id)
             
-            db.update_user(telegram_id, {"balance": new_balance})
+            if new_balance is None:
+                # سُحب المبلغ من iChancy ولم يُضف إلى البوت: يجب أن تتم التسوية يدوياً
+                logger.critical(f"🚨 فشل إضافة سحب {amount} للمستخدم {telegram_id} (اللاعب {player_id}) - يحتاج تسوية")
+                db.log_transaction(
+                    telegram_id=telegram_id,
+                    player_id=player_id,
+                    amount=amount,
+                    ttype="ichancy_withdraw",
+                    status="reconcile",
+                    api_response=str(data)
+                )
+                bot.send_message(
+                    chat_id,
+                    f"⚠️ تم سحب {amount:.2f} من iChancy لكن تعذرت إضافته إلى رصيدك في البوت.\n\n"
+                    "ستتم إضافة الرصيد من الإدارة."
+                )
+                return
             
             try:
                 _, _, new_ichancy_balance = api.get_player_balance(player_id)
@@ -0,0 +1,86 @@
+# job_queue.py - طابور مهام في الخلفية للعمليات البطيئة (المتصفح)
+import os
+import time
+import queue
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# الإعدادات
+# =========================
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", os.getenv("BROWSER_POOL_SIZE", "2")))
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "100"))
+
+
+class QueueFull(Exception):
+    """الطابور ممتلئ"""
+
+
+class JobQueue:
+    """طابور محدود مع عمال في threads - submit يعيد ترتيب المهمة فوراً"""
+
+    def __init__(self, name, handler, workers=JOB_WORKERS, maxsize=JOB_QUEUE_MAX):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pending = 0
+        self._running = 0
+        self._done = 0
+        self._failed = 0
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, daemon=True, name=f"{self.name}-worker-{i}")
+                t.start()
+                self._threads.append(t)
+        logger.info(f"👷 تم تشغيل {self.workers} عامل لطابور {self.name}")
+
+    def submit(self, job):
+        """إضافة مهمة - يعيد موقعها في الطابور (1 = التالية)"""
+        self.start()
+        with self._lock:
+            try:
+                self._queue.put_nowait((time.monotonic(), job))
+            except queue.Full:
+                raise QueueFull(f"طابور {self.name} ممتلئ")
+            self._pending += 1
+            return self._pending
+
+    def _worker(self):
+        while True:
+            enqueued_at, job = self._queue.get()
+            with self._lock:
+                self._pending -= 1
+                self._running += 1
+            waited = time.monotonic() - enqueued_at
+            try:
+                self.handler(job)
+                with self._lock:
+                    self._done += 1
+            except Exception as e:
+                logger.error(f"❌ فشل مهمة في طابور {self.name}: {e}")
+                with self._lock:
+                    self._failed += 1
+            finally:
+                with self._lock:
+                    self._running -= 1
+                self._queue.task_done()
+                logger.info(f"⏱️ مهمة {self.name}: انتظار {waited:.1f}ث")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": self._pending,
+                "running": self._running,
+                "done": self._done,
+                "failed": self._failed,
+                "workers": self.workers,
+            }
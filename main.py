@@ -1,5 +1,6 @@
 # main.py - النسخة المحسنة
 import os
+import time
 import threading
 import logging
 import asyncio
@@ -9,8 +10,14 @@ from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
 from flask import Flask, request, jsonify
 
 import db
+import startup_timing
+import telegram_sender
+import membership_cache
 from config import BOT_TOKEN, CHANNEL_ID, CHANNEL_INVITE_LINK
-from ichancy_api_selenium import IChancySeleniumAPI
+from session_manager import ensure_session
+from update_dispatcher import KeyedDispatcher
+
+startup_timing.mark("imports_done")
 
 # =========================
 # إعدادات التسجيل
@@ -27,31 +34,30 @@ logger = logging.getLogger(__name__)
 if not BOT_TOKEN:
     raise ValueError("❌ TELEGRAM_BOT_TOKEN غير موجود")
 
-bot = telebot.TeleBot(BOT_TOKEN, parse_mode="Markdown")
+# threaded=False: التوازي والترتيب يديرهما المُوزّع (مسار تسلسلي لكل مستخدم)
+bot = telebot.TeleBot(BOT_TOKEN, parse_mode="Markdown", threaded=False)
+telegram_sender.install(bot)
+
+def process_update(update):
+    bot.process_new_updates([update])
+
+dispatcher = KeyedDispatcher(process_update)
+
+# chat_member لا يصل إلا إذا طُلب صراحة (لتحديث كاش العضوية)
+ALLOWED_UPDATES = ["message", "edited_message", "callback_query", "chat_member", "my_chat_member"]
 
 # =========================
 # تهيئة API
 # =========================
-ichancy_api = None
 api_executor = ThreadPoolExecutor(max_workers=2)
 
 def init_ichancy_api():
-    """تهيئة API بشكل متزامن"""
-    global ichancy_api
+    """تهيئة جلسة IChancy المشتركة في الخلفية"""
     try:
-        logger.info("🚀 تهيئة IChancy API...")
-        ichancy_api = IChancySeleniumAPI(headless=True)
-        
-        # محاولة تسجيل الدخول
-        success, _ = ichancy_api.login()
-        if success:
-            logger.info("✅ تم تهيئة IChancy API بنجاح")
-        else:
-            logger.warning("⚠️ لم يتمكن API من تسجيل الدخول تلقائياً")
-            
+        ensure_session().start()
+        startup_timing.mark("session_started")
     except Exception as e:
         logger.error(f"❌ فشل تهيئة IChancy API: {e}")
-        ichancy_api = None
 
 # =========================
 # Web server (مهم لـ Railway)
@@ -67,7 +73,13 @@ def health_check():
     """فحص صحة النظام"""
     status = {
         "bot": "running",
-        "api": "ready" if ichancy_api else "not_ready",
+        "api": "ready" if ensure_session().is_ready() else "not_ready",
+        "session": ensure_session().stats(),
+        "startup": startup_timing.report(),
+        "dispatcher": dispatcher.stats(),
+        "telegram_sender": telegram_sender.get_sender().stats(),
+        "membership_cache": membership_cache.stats(),
+        "user_cache": db.user_cache_stats(),
         "redis": "connected" if db.check_redis_connection() else "disconnected"
     }
     return jsonify(status)
@@ -80,13 +92,27 @@ def webhook():
 # =========================
 # التحقق من الاشتراك
 # =========================
-def check_channel_membership(chat_id, user_id):
+def check_channel_membership(chat_id, user_id, trust_negative=True):
+    """التحقق من العضوية مع كاش Redis (trust_negative=False يعيد السؤال لغير الأعضاء)"""
+    cached = membership_cache.get(chat_id, user_id)
+    if cached or (cached is False and trust_negative):
+        return cached
+    
     try:
         member = bot.get_chat_member(chat_id, user_id)
-        return member.status in ["member", "administrator", "creator"]
     except Exception as e:
         logger.error(f"❌ خطأ في التحقق من العضوية: {e}")
         return False
+    
+    membership_cache.set_status(chat_id, user_id, member.status)
+    return member.status in membership_cache.MEMBER_STATUSES
+
+@bot.chat_member_handler()
+def handle_chat_member(update):
+    """تغير عضوية في القناة (البوت مشرف فيها): تحديث الكاش فوراً"""
+    if update.chat.id != CHANNEL_ID:
+        return
+    membership_cache.set_status(CHANNEL_ID, update.new_chat_member.user.id, update.new_chat_member.status)
 
 # =========================
 # القائمة الرئيسية
@@ -179,33 +205,36 @@ def send_welcome(message):
 # =========================
 # رسالة الاشتراك
 # =========================
-def show_channel_requirement(message):
+CHANNEL_REQUIREMENT_TEXT = (
+    "📢 **مرحباً!**\n\n"
+    "للبدء في استخدام البوت، يجب الانضمام إلى قناتنا أولاً:\n\n"
+    "✅ اشترك في القناة\n"
+    "✅ اضغط على زر 'تحقق من الاشتراك'"
+)
+
+def build_channel_keyboard():
     kb = InlineKeyboardMarkup()
     kb.add(
         InlineKeyboardButton("🔗 انضم للقناة", url=CHANNEL_INVITE_LINK),
         InlineKeyboardButton("✅ تحقق من الاشتراك", callback_data="check_join")
     )
-    
-    bot.send_message(
-        message.chat.id,
-        "📢 **مرحباً!**\n\n"
-        "للبدء في استخدام البوت، يجب الانضمام إلى قناتنا أولاً:\n\n"
-        "✅ اشترك في القناة\n"
-        "✅ اضغط على زر 'تحقق من الاشتراك'",
-        reply_markup=kb
-    )
+    return kb
+
+def show_channel_requirement(message):
+    bot.send_message(message.chat.id, CHANNEL_REQUIREMENT_TEXT, reply_markup=build_channel_keyboard())
 
 # =========================
 # الشروط
 # =========================
-def show_terms(message, user_id):
+def build_terms_keyboard(user_id):
     kb = InlineKeyboardMarkup()
     kb.add(
         InlineKeyboardButton("✅ أوافق على الشروط", callback_data=f"accept_terms:{user_id}"),
         InlineKeyboardButton("❌ لا أوافق", callback_data=f"reject_terms:{user_id}")
     )
+    return kb
 
-    terms_text = """
+TERMS_TEXT = """
 📜 **شروط وأحكام استخدام البوت**
 
 باستخدامك لهذا البوت، فإنك توافق على الشروط التالية:
@@ -219,14 +248,16 @@ def show_terms(message, user_id):
 بالنقر على "أوافق" فإنك تقر بأنك قد قرأت وفهمت هذه الشروط.
     """
 
-    bot.send_message(message.chat.id, terms_text, reply_markup=kb)
+def show_terms(message, user_id):
+    bot.send_message(message.chat.id, TERMS_TEXT, reply_markup=build_terms_keyboard(user_id))
 
 # =========================
 # تحقق الاشتراك
 # =========================
 @bot.callback_query_handler(func=lambda c: c.data == "check_join")
 def handle_check_join(call):
-    if check_channel_membership(CHANNEL_ID, call.from_user.id):
+    # المستخدم ضغط بعد الانضمام للتو: لا نثق بنتيجة "غير عضو" المخزنة
+    if check_channel_membership(CHANNEL_ID, call.from_user.id, trust_negative=False):
         db.mark_channel_joined(call.from_user.id)
         bot.answer_callback_query(call.id, "✅ تم التحقق من الاشتراك!")
         
@@ -285,14 +316,8 @@ def handle_reject_terms(call):
 # =========================
 # IChancy Menu
 # =========================
-@bot.callback_query_handler(func=lambda c: c.data == "ichancy")
-def handle_ichancy(call):
-    user = db.get_user(call.from_user.id)
-
-    if not user:
-        bot.answer_callback_query(call.id, "❌ المستخدم غير موجود!")
-        return
-
+def build_ichancy_menu(user):
+    """نص وأزرار قائمة حساب iChancy للمستخدم"""
     has_account = all([
         user.get("player_id"),
         user.get("player_email"),
@@ -325,7 +350,17 @@ def handle_ichancy(call):
         )
 
     keyboard.add(InlineKeyboardButton("🔙 رجوع", callback_data="back_main"))
+    return text, keyboard
+
+@bot.callback_query_handler(func=lambda c: c.data == "ichancy")
+def handle_ichancy(call):
+    user = db.get_user(call.from_user.id)
+
+    if not user:
+        bot.answer_callback_query(call.id, "❌ المستخدم غير موجود!")
+        return
 
+    text, keyboard = build_ichancy_menu(user)
     bot.edit_message_text(
         text,
         call.message.chat.id,
@@ -394,26 +429,29 @@ def handle_back_main(call):
 # =========================
 # باقي الأزرار
 # =========================
-@bot.callback_query_handler(func=lambda c: c.data in ["deposit", "withdraw", "referrals", "gift_code", "gift_balance", "contact", "admin_msg", "tutorials", "transactions", "download_app", "terms"])
-def handle_other_buttons(call):
-    button_texts = {
-        "deposit": "💰 **شحن الرصيد**\n\nهذه الميزة قيد التطوير.",
-        "withdraw": "💸 **سحب الرصيد**\n\nهذه الميزة قيد التطوير.",
-        "referrals": "👥 **نظام الإحالات**\n\nهذه الميزة قيد التطوير.",
-        "gift_code": "🎁 **كود الهدية**\n\nهذه الميزة قيد التطوير.",
-        "gift_balance": "💝 **إهداء الرصيد**\n\nهذه الميزة قيد التطوير.",
-        "contact": "📞 **تواصل معنا**\n\nللتواصل: @YourSupportUsername",
-        "admin_msg": "✉️ **رسالة للإدارة**\n\nأرسل رسالتك هنا.",
-        "tutorials": "📚 **الشروحات**\n\nسيتم إضافة الشروحات قريباً.",
-        "transactions": "📜 **سجل المعاملات**\n\nهذه الميزة قيد التطوير.",
-        "download_app": "📱 **تحميل التطبيق**\n\nرابط التطبيق: https://www.ichancy.com/app",
-        "terms": "📄 **الشروط والأحكام**\n\nأنت قد وافقت على الشروط مسبقاً."
-    }
-    
-    text = button_texts.get(call.data, "هذه الميزة قيد التطوير.")
-    
+BUTTON_TEXTS = {
+    "deposit": "💰 **شحن الرصيد**\n\nهذه الميزة قيد التطوير.",
+    "withdraw": "💸 **سحب الرصيد**\n\nهذه الميزة قيد التطوير.",
+    "referrals": "👥 **نظام الإحالات**\n\nهذه الميزة قيد التطوير.",
+    "gift_code": "🎁 **كود الهدية**\n\nهذه الميزة قيد التطوير.",
+    "gift_balance": "💝 **إهداء الرصيد**\n\nهذه الميزة قيد التطوير.",
+    "contact": "📞 **تواصل معنا**\n\nللتواصل: @YourSupportUsername",
+    "admin_msg": "✉️ **رسالة للإدارة**\n\nأرسل رسالتك هنا.",
+    "tutorials": "📚 **الشروحات**\n\nسيتم إضافة الشروحات قريباً.",
+    "transactions": "📜 **سجل المعاملات**\n\nهذه الميزة قيد التطوير.",
+    "download_app": "📱 **تحميل التطبيق**\n\nرابط التطبيق: https://www.ichancy.com/app",
+    "terms": "📄 **الشروط والأحكام**\n\nأنت قد وافقت على الشروط مسبقاً."
+}
+
+def build_back_keyboard():
     kb = InlineKeyboardMarkup()
     kb.add(InlineKeyboardButton("🔙 رجوع", callback_data="ichancy"))
+    return kb
+
+@bot.callback_query_handler(func=lambda c: c.data in BUTTON_TEXTS)
+def handle_other_buttons(call):
+    text = BUTTON_TEXTS.get(call.data, "هذه الميزة قيد التطوير.")
+    kb = build_back_keyboard()
     
     bot.edit_message_text(
         text,
@@ -436,11 +474,22 @@ def handle_unknown_callback(call):
 # =========================
 def run_bot():
     """تشغيل البوت في thread منفصل"""
-    try:
-        logger.info("🚀 بدء تشغيل البوت...")
-        bot.infinity_polling(timeout=60, long_polling_timeout=60)
-    except Exception as e:
-        logger.error(f"❌ خطأ في تشغيل البوت: {e}")
+    logger.info("🚀 بدء تشغيل البوت...")
+    bot.remove_webhook()
+    offset = None
+    while True:
+        try:
+            updates = bot.get_updates(
+                offset=offset, timeout=60, long_polling_timeout=60, allowed_updates=ALLOWED_UPDATES
+            )
+        except Exception as e:
+            logger.error(f"❌ خطأ في جلب التحديثات: {e}")
+            time.sleep(3)
+            continue
+        
+        for update in updates:
+            offset = update.update_id + 1
+            dispatcher.submit(update)
 
 def run_flask():
     """تشغيل Flask في thread منفصل"""
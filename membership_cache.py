@@ -0,0 +1,82 @@
+# membership_cache.py - تخزين نتيجة التحقق من الاشتراك في القناة في Redis
+import os
+import logging
+import threading
+import redis
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# الإعدادات
+# =========================
+MEMBERSHIP_TTL = int(os.getenv("MEMBERSHIP_TTL", "3600"))                 # عضو
+MEMBERSHIP_NEGATIVE_TTL = int(os.getenv("MEMBERSHIP_NEGATIVE_TTL", "60"))  # غير عضو
+REDIS_MEMBERSHIP_KEY = "membership:{chat_id}:{user_id}"
+
+MEMBER_STATUSES = ("member", "administrator", "creator")
+
+_client = None
+_client_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "errors": 0}
+_stats_lock = threading.Lock()
+
+
+def _redis():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = redis.from_url(os.getenv("REDIS_URL"), decode_responses=True)
+        return _client
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def _key(chat_id, user_id):
+    return REDIS_MEMBERSHIP_KEY.format(chat_id=chat_id, user_id=user_id)
+
+
+def get(chat_id, user_id):
+    """True/False من الكاش، أو None إذا لم يكن مخزناً (أو تعذر الوصول إلى Redis)"""
+    try:
+        value = _redis().get(_key(chat_id, user_id))
+    except Exception as e:
+        _count("errors")
+        logger.warning(f"⚠️ تعذرت قراءة كاش العضوية: {e}")
+        return None
+
+    if value is None:
+        _count("misses")
+        return None
+    _count("hits")
+    return value == "1"
+
+
+def put(chat_id, user_id, is_member):
+    ttl = MEMBERSHIP_TTL if is_member else MEMBERSHIP_NEGATIVE_TTL
+    try:
+        _redis().setex(_key(chat_id, user_id), ttl, "1" if is_member else "0")
+    except Exception as e:
+        _count("errors")
+        logger.warning(f"⚠️ تعذر حفظ كاش العضوية: {e}")
+
+
+def set_status(chat_id, user_id, status):
+    """تحديث الكاش من حالة عضوية (من تحديث chat_member مثلاً)"""
+    put(chat_id, user_id, status in MEMBER_STATUSES)
+
+
+def invalidate(chat_id, user_id):
+    try:
+        _redis().delete(_key(chat_id, user_id))
+    except Exception as e:
+        _count("errors")
+        logger.warning(f"⚠️ تعذر حذف كاش العضوية: {e}")
+
+
+def stats():
+    with _stats_lock:
+        counters = dict(_stats)
+    return dict(counters, ttl=MEMBERSHIP_TTL, negative_ttl=MEMBERSHIP_NEGATIVE_TTL)
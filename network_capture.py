@@ -0,0 +1,116 @@
+# network_capture.py - التقاط استجابات JSON من DevTools بدلاً من تحليل page_source
+import json
+import time
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# الإعدادات
+# =========================
+DEFAULT_URL_FILTERS = ("/global/api/",)
+BUFFER_SIZE = 200
+POLL_INTERVAL = 0.1
+
+
+class CapturedResponse:
+    """استجابة شبكة ملتقطة مع جسمها بعد تحليله"""
+
+    def __init__(self, seq, url, status, data):
+        self.seq = seq
+        self.url = url
+        self.status = status
+        self.data = data
+        self.captured_at = time.time()
+
+    @property
+    def ok(self):
+        """نجاح حسب صيغة واجهات لوحة الوكيل: HTTP 200 و result غير فارغة"""
+        return self.status == 200 and isinstance(self.data, dict) and bool(self.data.get("result"))
+
+    def error_message(self, default="فشل غير معروف"):
+        notification = self.data.get("notification") if isinstance(self.data, dict) else None
+        if isinstance(notification, list) and notification:
+            return notification[0].get("content", default)
+        return default
+
+
+class NetworkCapture:
+    """يقرأ سجل performance للمتصفح ويحفظ استجابات XHR المطابقة ليُنتظر عليها بشكل محدد"""
+
+    def __init__(self, driver, url_filters=DEFAULT_URL_FILTERS):
+        self.driver = driver
+        self.url_filters = tuple(url_filters)
+        self._pending = {}
+        self._buffer = deque(maxlen=BUFFER_SIZE)
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def _matches(self, url):
+        return any(f in url for f in self.url_filters)
+
+    def _body(self, request_id):
+        try:
+            body = self.driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+            return json.loads(body.get("body") or "null")
+        except Exception as e:
+            logger.debug(f"getResponseBody failed: {e}")
+            return None
+
+    def poll(self):
+        """سحب السجلات الجديدة من المتصفح وتحويل الاستجابات المكتملة إلى عناصر في المخزن"""
+        try:
+            entries = self.driver.get_log("performance")
+        except Exception as e:
+            logger.debug(f"performance log unavailable: {e}")
+            return
+
+        with self._lock:
+            for entry in entries:
+                message = json.loads(entry["message"]).get("message", {})
+                method = message.get("method")
+                params = message.get("params", {})
+                request_id = params.get("requestId")
+
+                if method == "Network.responseReceived":
+                    response = params.get("response", {})
+                    if self._matches(response.get("url", "")):
+                        self._pending[request_id] = (response.get("url"), response.get("status"))
+                elif method == "Network.loadingFinished" and request_id in self._pending:
+                    url, status = self._pending.pop(request_id)
+                    self._seq += 1
+                    self._buffer.append(CapturedResponse(self._seq, url, status, self._body(request_id)))
+                elif method == "Network.loadingFailed":
+                    self._pending.pop(request_id, None)
+
+    def mark(self):
+        """نقطة مرجعية: wait_for(since=mark) يتجاهل ما قبلها"""
+        self.poll()
+        with self._lock:
+            return self._seq
+
+    def find(self, url_part, since=0, latest=False):
+        """أول (أو آخر) استجابة مطابقة بعد النقطة since"""
+        with self._lock:
+            matches = [r for r in self._buffer if r.seq > since and url_part in r.url]
+        if not matches:
+            return None
+        return matches[-1] if latest else matches[0]
+
+    def wait_for(self, url_part, since=0, timeout=10, latest=False):
+        """انتظار استجابة رابطها يحتوي url_part بعد النقطة since - None عند انتهاء المهلة"""
+        deadline = time.monotonic() + timeout
+        while True:
+            self.poll()
+            response = self.find(url_part, since, latest)
+            if response or time.monotonic() >= deadline:
+                return response
+            time.sleep(POLL_INTERVAL)
+
+    def clear(self):
+        self.poll()
+        with self._lock:
+            self._buffer.clear()
+            self._pending.clear()
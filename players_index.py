@@ -0,0 +1,215 @@
+# players_index.py - نسخة محلية من جدول لاعبي الوكيل للتحقق الفوري من الأسماء
+import os
+import time
+import uuid
+import threading
+import logging
+import redis
+
+from ichancy_http_client import IChancyHTTPClient, HTTPClientError
+from session_lock import RELEASE_LUA
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# الإعدادات
+# =========================
+REDIS_INDEX_KEY = "ichancy:players_index"          # username (lower) -> player_id
+REDIS_INDEX_META_KEY = "ichancy:players_index:meta"
+REDIS_SYNC_LOCK_KEY = "ichancy:players_index:sync_lock"
+
+SYNC_INTERVAL = int(os.getenv("PLAYERS_INDEX_SYNC_INTERVAL", "300"))
+FULL_SYNC_INTERVAL = int(os.getenv("PLAYERS_INDEX_FULL_SYNC_INTERVAL", "21600"))
+STALE_AFTER = int(os.getenv("PLAYERS_INDEX_STALE_AFTER", str(SYNC_INTERVAL * 3)))
+PAGE_SIZE = int(os.getenv("PLAYERS_INDEX_PAGE_SIZE", "100"))
+
+
+class PlayersIndex:
+    """فهرس username→player_id في Redis مع مزامنة كاملة وتزايدية في الخلفية"""
+
+    def __init__(self, redis_client, http_client=None, relogin=None):
+        self.redis = redis_client
+        self.http = http_client or IChancyHTTPClient(redis_client, relogin=relogin)
+        self._release_lock = self.redis.register_script(RELEASE_LUA)
+        self._thread = None
+        self._stop = threading.Event()
+
+    # =========================
+    # القراءة
+    # =========================
+    def is_ready(self):
+        """الفهرس صالح للاستخدام: تمت مزامنة كاملة ولم يتقادم"""
+        meta = self.redis.hgetall(REDIS_INDEX_META_KEY)
+        if not meta.get("full_synced_at"):
+            return False
+        return time.time() - float(meta.get("synced_at", 0)) < STALE_AFTER
+
+    def lookup(self, username):
+        return self.redis.hget(REDIS_INDEX_KEY, username.lower())
+
+    def exists(self, username):
+        """True/False من الفهرس، أو None إذا لم يكن الفهرس جاهزاً"""
+        if not self.is_ready():
+            return None
+        return self.redis.hexists(REDIS_INDEX_KEY, username.lower())
+
+    def exists_many(self, usernames):
+        """نتيجة عدة أسماء في استدعاء واحد، أو None إذا لم يكن الفهرس جاهزاً"""
+        if not self.is_ready():
+            return None
+        found = self.redis.hmget(REDIS_INDEX_KEY, [u.lower() for u in usernames])
+        return {u: f is not None for u, f in zip(usernames, found)}
+
+    def add(self, username, player_id=None):
+        self.redis.hset(REDIS_INDEX_KEY, username.lower(), str(player_id or ""))
+
+    def stats(self):
+        meta = self.redis.hgetall(REDIS_INDEX_META_KEY)
+        meta["count"] = self.redis.hlen(REDIS_INDEX_KEY)
+        meta["ready"] = self.is_ready()
+        return meta
+
+    # =========================
+    # المزامنة
+    # =========================
+    @staticmethod
+    def _mapping(records):
+        return {
+            str(r.get("username", "")).lower(): str(r.get("playerId", ""))
+            for r in records
+            if r.get("username")
+        }
+
+    def full_sync(self):
+        """المرور على جميع صفحات اللاعبين وبناء الفهرس من جديد"""
+        tmp_key = f"{REDIS_INDEX_KEY}:building"
+        self.redis.delete(tmp_key)
+
+        start, total = 0, 0
+        while True:
+            records = self.http.search_players(None, start=start, limit=PAGE_SIZE)
+            mapping = self._mapping(records)
+            if mapping:
+                self.redis.hset(tmp_key, mapping=mapping)
+                total += len(mapping)
+            if len(records) < PAGE_SIZE:
+                break
+            start += PAGE_SIZE
+
+        # استبدال ذري حتى لا يرى القراء فهرساً نصف مبني
+        pipe = self.redis.pipeline()
+        if total:
+            pipe.rename(tmp_key, REDIS_INDEX_KEY)
+        else:
+            pipe.delete(REDIS_INDEX_KEY)
+        now = time.time()
+        pipe.hset(REDIS_INDEX_META_KEY, mapping={"full_synced_at": now, "synced_at": now})
+        pipe.execute()
+        logger.info(f"📇 مزامنة كاملة لفهرس اللاعبين: {total} لاعب")
+        return total
+
+    @staticmethod
+    def _player_ids(records):
+        """معرفات اللاعبين الرقمية بالترتيب، أو None إذا لم تكن كلها أرقاماً"""
+        try:
+            return [int(r.get("playerId")) for r in records]
+        except (TypeError, ValueError):
+            return None
+
+    def incremental_sync(self):
+        """جلب الصفحات الأحدث فقط حتى نصل إلى صفحة لا جديد فيها
+
+        يفترض أن قائمة اللاعبين بدون فلتر مرتبة من الأحدث إلى الأقدم (ترتيب اللوحة
+        الافتراضي، playerId تنازلي). إذا ظهر ترتيب مختلف فالتوقف عند أول صفحة معروفة
+        قد يفوّت لاعبين جدداً، لذلك نتحول إلى مزامنة كاملة.
+        """
+        start, added = 0, 0
+        previous_id = None
+        while True:
+            records = self.http.search_players(None, start=start, limit=PAGE_SIZE)
+
+            ids = self._player_ids(records)
+            if ids:
+                if previous_id is not None:
+                    ids.insert(0, previous_id)
+                if any(a < b for a, b in zip(ids, ids[1:])):
+                    logger.warning("⚠️ قائمة اللاعبين ليست من الأحدث إلى الأقدم، تحويل إلى مزامنة كاملة")
+                    return self.full_sync()
+                previous_id = ids[-1]
+
+            mapping = self._mapping(records)
+            if mapping:
+                known = self.redis.hmget(REDIS_INDEX_KEY, list(mapping))
+                new = {k: v for (k, v), old in zip(mapping.items(), known) if old is None}
+                if new:
+                    self.redis.hset(REDIS_INDEX_KEY, mapping=new)
+                    added += len(new)
+                else:
+                    break
+            if len(records) < PAGE_SIZE:
+                break
+            start += PAGE_SIZE
+
+        self.redis.hset(REDIS_INDEX_META_KEY, "synced_at", time.time())
+        if added:
+            logger.info(f"📇 مزامنة تزايدية: {added} لاعب جديد")
+        return added
+
+    def sync(self):
+        """مزامنة واحدة (كاملة أو تزايدية) بقفل حتى لا تتكرر بين العمليات"""
+        token = uuid.uuid4().hex
+        if not self.redis.set(REDIS_SYNC_LOCK_KEY, token, nx=True, ex=SYNC_INTERVAL):
+            return
+        try:
+            meta = self.redis.hgetall(REDIS_INDEX_META_KEY)
+            last_full = float(meta.get("full_synced_at", 0))
+            if time.time() - last_full > FULL_SYNC_INTERVAL:
+                self.full_sync()
+            else:
+                self.incremental_sync()
+        except HTTPClientError as e:
+            logger.warning(f"⚠️ تعذرت مزامنة فهرس اللاعبين: {e}")
+        finally:
+            # حذف القفل فقط إذا كان لا يزال لنا (مزامنة طويلة قد تتجاوز مدته)
+            self._release_lock(keys=[REDIS_SYNC_LOCK_KEY], args=[token])
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sync()
+            except Exception as e:
+                logger.error(f"❌ خطأ في مزامنة فهرس اللاعبين: {e}")
+            self._stop.wait(SYNC_INTERVAL)
+
+    def start_background_sync(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="players-index-sync")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+# =========================
+# النسخة المشتركة
+# =========================
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_players_index(redis_client=None, relogin=None):
+    """الحصول على فهرس اللاعبين المشترك في هذه العملية
+
+    relogin يُستخدم لتجديد جلسة عميل HTTP الخاص بالفهرس عند انتهائها، ويُضاف
+    للفهرس الموجود إذا أُنشئ قبل ذلك بدونه.
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            client = redis_client or redis.from_url(os.getenv("REDIS_URL"), decode_responses=True)
+            _index = PlayersIndex(client, relogin=relogin)
+        elif relogin and _index.http.relogin is None:
+            _index.http.relogin = relogin
+        return _index
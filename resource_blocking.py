@@ -0,0 +1,77 @@
+# resource_blocking.py - منع تحميل الموارد غير الضرورية في متصفح لوحة الوكيل
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# الإعدادات
+# =========================
+# off | light (صور، خطوط، وسائط، تتبع) | strict (light + ملفات CSS)
+# الافتراضي off حتى تُملأ نتائج bench_resource_blocking.py في BENCHMARKS.md
+BLOCK_POLICY = os.getenv("ICHANCY_BLOCK_RESOURCES", "off")
+
+# أنماط إضافية مفصولة بفواصل (مثل *cdn.example.com*)
+BLOCK_EXTRA = [p.strip() for p in os.getenv("ICHANCY_BLOCK_EXTRA", "").split(",") if p.strip()]
+
+IMAGE_PATTERNS = ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico", "*.bmp"]
+FONT_PATTERNS = ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot"]
+MEDIA_PATTERNS = ["*.mp4", "*.webm", "*.mp3", "*.ogg", "*.wav"]
+STYLE_PATTERNS = ["*.css"]
+
+# خدمات التحليلات والدردشة: لا علاقة لها بعمل اللوحة (خدمات الكابتشا غير محظورة)
+THIRD_PARTY_PATTERNS = [
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*doubleclick.net*",
+    "*facebook.net*",
+    "*connect.facebook.com*",
+    "*hotjar.com*",
+    "*mc.yandex.ru*",
+    "*clarity.ms*",
+    "*sentry.io*",
+    "*intercom.io*",
+    "*livechatinc.com*",
+    "*tawk.to*",
+]
+
+# ما يُسمح بحظره في صفحة تسجيل الدخول: الصور وCSS تبقى لأن الكابتشا/التحدي يحتاجها
+LOGIN_UNSAFE_PATTERNS = set(IMAGE_PATTERNS + STYLE_PATTERNS)
+
+POLICIES = {
+    "off": [],
+    "light": IMAGE_PATTERNS + FONT_PATTERNS + MEDIA_PATTERNS + THIRD_PARTY_PATTERNS,
+    "strict": IMAGE_PATTERNS + FONT_PATTERNS + MEDIA_PATTERNS + STYLE_PATTERNS + THIRD_PARTY_PATTERNS,
+}
+
+
+def blocked_patterns(policy=None, stage="session"):
+    """قائمة أنماط الروابط المحظورة للسياسة المطلوبة
+
+    stage="login" لصفحة تسجيل الدخول (بدون صور وCSS)، و"session" بعد نجاح الدخول.
+    """
+    policy = policy or BLOCK_POLICY
+    if policy not in POLICIES:
+        logger.warning(f"⚠️ سياسة حظر غير معروفة '{policy}'، استخدام light")
+        policy = "light"
+    if policy == "off":
+        return []
+    patterns = POLICIES[policy] + BLOCK_EXTRA
+    if stage == "login":
+        patterns = [p for p in patterns if p not in LOGIN_UNSAFE_PATTERNS]
+    return patterns
+
+
+def apply(driver, policy=None, stage="session"):
+    """تفعيل الحظر عبر CDP (يستبدل الأنماط السابقة) - يعيد عدد الأنماط المحظورة"""
+    if (policy or BLOCK_POLICY) == "off":
+        return 0
+    patterns = blocked_patterns(policy, stage)
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+        logger.info(f"🚫 حظر الموارد ({policy or BLOCK_POLICY}/{stage}): {len(patterns)} نمط")
+        return len(patterns)
+    except Exception as e:
+        logger.warning(f"⚠️ تعذر تفعيل حظر الموارد: {e}")
+        return 0
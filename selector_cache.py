@@ -0,0 +1,99 @@
+# selector_cache.py - تذكر المحدد (selector) الناجح لكل حقل وتجربته أولاً
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# الإعدادات
+# =========================
+REDIS_SCORES_KEY = "ichancy:selectors:{field}"        # zset: selector -> score
+REDIS_HITS_KEY = "ichancy:selectors:{field}:hits"     # hash: selector -> hits
+LOCAL_TTL = 60  # ثوانٍ قبل إعادة قراءة الترتيب من Redis
+
+HIT_SCORE = 1
+MISS_SCORE = -2  # الفشل يخفض الترتيب أسرع من النجاح
+
+# نطاق محدود: محدد نجح آلاف المرات لا يحتاج آلاف الإخفاقات ليتراجع
+SCORE_MIN = -6
+SCORE_MAX = 5
+
+# نفس منطق next_score لكن ذرياً في Redis
+BUMP_LUA = """
+local s = tonumber(redis.call('ZSCORE', KEYS[1], ARGV[1]) or '0')
+local delta = tonumber(ARGV[2])
+if (delta < 0 and s > 0) or (delta > 0 and s < 0) then s = 0 end
+s = math.max(tonumber(ARGV[3]), math.min(tonumber(ARGV[4]), s + delta))
+redis.call('ZADD', KEYS[1], s, ARGV[1])
+if delta > 0 then redis.call('HINCRBY', KEYS[2], ARGV[1], 1) end
+return tostring(s)
+"""
+
+
+def next_score(current, delta):
+    """النتيجة الجديدة: تغيير الاتجاه يبدأ من الصفر (إخفاق محدد ناجح يهبط به تحت غير المجربة فوراً)"""
+    if (delta < 0 < current) or (delta > 0 > current):
+        current = 0
+    return max(SCORE_MIN, min(SCORE_MAX, current + delta))
+
+
+def _key(selector):
+    by, value = selector
+    return f"{by}|{value}"
+
+
+class SelectorCache:
+    """ترتيب قوائم المحددات البديلة حسب نجاحها السابق (مشترك عبر Redis)"""
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self._local = {}
+        self._lock = threading.Lock()
+        self._bump_script = None
+
+    def _scores(self, field):
+        with self._lock:
+            cached = self._local.get(field)
+            if cached and time.monotonic() - cached[0] < LOCAL_TTL:
+                return cached[1]
+
+        try:
+            scores = dict(self.redis.zrange(REDIS_SCORES_KEY.format(field=field), 0, -1, withscores=True))
+        except Exception as e:
+            logger.warning(f"⚠️ تعذرت قراءة ترتيب المحددات: {e}")
+            scores = {}
+
+        with self._lock:
+            self._local[field] = (time.monotonic(), scores)
+        return scores
+
+    def order(self, field, selectors):
+        """المحددات مرتبة حسب النتيجة، مع الحفاظ على الترتيب الأصلي عند التعادل"""
+        scores = self._scores(field)
+        return sorted(selectors, key=lambda s: -scores.get(_key(s), 0))
+
+    def _bump(self, field, selector, delta):
+        key = _key(selector)
+        with self._lock:
+            cached = self._local.get(field)
+            if cached:
+                cached[1][key] = next_score(cached[1].get(key, 0), delta)
+        try:
+            if self._bump_script is None:
+                self._bump_script = self.redis.register_script(BUMP_LUA)
+            self._bump_script(
+                keys=[REDIS_SCORES_KEY.format(field=field), REDIS_HITS_KEY.format(field=field)],
+                args=[key, delta, SCORE_MIN, SCORE_MAX],
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ تعذر تحديث ترتيب المحددات: {e}")
+
+    def hit(self, field, selector):
+        self._bump(field, selector, HIT_SCORE)
+
+    def miss(self, field, selector):
+        self._bump(field, selector, MISS_SCORE)
+
+    def stats(self, field):
+        return self.redis.hgetall(REDIS_HITS_KEY.format(field=field))
@@ -0,0 +1,163 @@
+# selenium_jobs.py - إرسال مهام المتصفح إلى عمال منفصلين عبر Redis Streams
+import os
+import json
+import uuid
+import time
+import logging
+import redis
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# الإعدادات
+# =========================
+# local: طابور داخل العملية - stream: عمال selenium_worker.py منفصلون
+# (عملية worker في Procfile لا تستلم أي مهمة إلا إذا كانت عمليات web على stream)
+JOB_BACKEND = os.getenv("JOB_BACKEND", "local")
+
+REDIS_STREAM_KEY = "ichancy:jobs"
+REDIS_DEAD_STREAM_KEY = "ichancy:jobs:dead"
+REDIS_RESULT_KEY = "ichancy:jobs:result:{job_id}"
+REDIS_SECRET_KEY = "ichancy:jobs:secret:{ref}"
+CONSUMER_GROUP = "selenium-workers"
+
+STREAM_MAXLEN = int(os.getenv("JOB_STREAM_MAXLEN", "10000"))
+RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "300"))
+JOB_CALL_TIMEOUT = float(os.getenv("JOB_CALL_TIMEOUT", "120"))
+# مهمة معلقة لم يؤكدها عاملها تُستعاد بعد هذه المدة (عامل توقف أثناء التنفيذ)
+VISIBILITY_TIMEOUT_MS = int(os.getenv("JOB_VISIBILITY_TIMEOUT_MS", "180000"))
+JOB_SECRET_TTL = int(os.getenv("JOB_SECRET_TTL", "1800"))
+
+# حقول لا تُكتب في الـ stream (ولا في dead-letter): تُحفظ في مفتاح قصير العمر ويُمرر مرجعه فقط
+SECRET_FIELDS = ("password",)
+
+_redis = None
+
+
+class JobTimeout(Exception):
+    """لم تصل نتيجة المهمة خلال المهلة"""
+
+
+def use_stream():
+    return JOB_BACKEND == "stream"
+
+
+def get_redis():
+    global _redis
+    if _redis is None:
+        _redis = redis.from_url(os.getenv("REDIS_URL"), decode_responses=True)
+    return _redis
+
+
+def ensure_group(client=None):
+    """إنشاء مجموعة المستهلكين إذا لم تكن موجودة"""
+    client = client or get_redis()
+    try:
+        client.xgroup_create(REDIS_STREAM_KEY, CONSUMER_GROUP, id="0", mkstream=True)
+    except redis.ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def _stash_secrets(payload):
+    """استبدال الحقول السرية بمراجع لمفاتيح Redis تنتهي صلاحيتها"""
+    payload = dict(payload)
+    for field in SECRET_FIELDS:
+        if field in payload:
+            ref = uuid.uuid4().hex
+            get_redis().setex(REDIS_SECRET_KEY.format(ref=ref), JOB_SECRET_TTL, payload.pop(field))
+            payload[f"{field}_ref"] = ref
+    return payload
+
+
+def resolve_secrets(payload, client=None):
+    """استرجاع الحقول السرية وحذفها من Redis (تُقرأ مرة واحدة)"""
+    client = client or get_redis()
+    for field in SECRET_FIELDS:
+        ref = payload.pop(f"{field}_ref", None)
+        if ref is None:
+            continue
+        key = REDIS_SECRET_KEY.format(ref=ref)
+        pipe = client.pipeline()
+        pipe.get(key)
+        pipe.delete(key)
+        value, _ = pipe.execute()
+        if value is None:
+            raise Exception(f"انتهت صلاحية الحقل السري {field} للمهمة")
+        payload[field] = value
+    return payload
+
+
+def submit_job(job_type, payload, deadline=None):
+    """إضافة مهمة إلى الـ stream - يعيد معرف المهمة
+
+    deadline: وقت توقف المستدعي عن انتظار النتيجة (للمهام المنتظرة عبر call)؛
+    العامل لا يعيد محاولتها ولا ينفذها بعد هذا الوقت لأن نتيجتها لن تصل لأحد.
+    """
+    job_id = uuid.uuid4().hex
+    payload = _stash_secrets(payload)
+    fields = {
+        "job_id": job_id,
+        "type": job_type,
+        "payload": json.dumps(payload),
+        "submitted_at": time.time(),
+    }
+    if deadline is not None:
+        fields["deadline"] = deadline
+    get_redis().xadd(REDIS_STREAM_KEY, fields, maxlen=STREAM_MAXLEN, approximate=True)
+    return job_id
+
+
+def is_awaited(fields):
+    """هل ينتظر مستدعٍ نتيجة هذه المهمة؟ (أي فشل يُنشر له فوراً بدل إعادة المحاولة)"""
+    return bool(fields.get("deadline"))
+
+
+def caller_gone(fields, now=None):
+    """المستدعي تجاوز مهلته: تنفيذ المهمة الآن لا فائدة منه"""
+    deadline = fields.get("deadline")
+    return bool(deadline) and (now or time.time()) > float(deadline)
+
+
+def wait_result(job_id, timeout=JOB_CALL_TIMEOUT):
+    """انتظار نتيجة مهمة"""
+    item = get_redis().blpop(REDIS_RESULT_KEY.format(job_id=job_id), timeout=int(max(1, timeout)))
+    if not item:
+        raise JobTimeout(f"انتهت مهلة المهمة {job_id}")
+    return json.loads(item[1])
+
+
+def call(job_type, payload, timeout=JOB_CALL_TIMEOUT):
+    """إرسال مهمة وانتظار نتيجتها"""
+    return wait_result(submit_job(job_type, payload, deadline=time.time() + timeout), timeout)
+
+
+def publish_result(job_id, result, client=None):
+    """نشر نتيجة المهمة للمستدعي المنتظر"""
+    client = client or get_redis()
+    key = REDIS_RESULT_KEY.format(job_id=job_id)
+    pipe = client.pipeline()
+    pipe.rpush(key, json.dumps(result))
+    pipe.expire(key, RESULT_TTL)
+    pipe.execute()
+
+
+def queue_position():
+    """ترتيب تقريبي لمهمة جديدة: المهام المعلقة + غير المقروءة + 1"""
+    try:
+        for group in get_redis().xinfo_groups(REDIS_STREAM_KEY):
+            if group.get("name") == CONSUMER_GROUP:
+                return (group.get("pending") or 0) + (group.get("lag") or 0) + 1
+    except redis.ResponseError:
+        pass
+    return 1
+
+
+def stats():
+    client = get_redis()
+    return {
+        "backend": JOB_BACKEND,
+        "stream_length": client.xlen(REDIS_STREAM_KEY),
+        "dead_letters": client.xlen(REDIS_DEAD_STREAM_KEY),
+        "position": queue_position(),
+    }
@@ -0,0 +1,213 @@
+# selenium_worker.py - عامل المتصفح: يستهلك مهام Selenium من Redis Streams
+import os
+import json
+import time
+import socket
+import signal
+import logging
+import threading
+import telebot
+
+import selenium_jobs
+
+# العامل هو من يملك المتصفحات: كل العمليات هنا محلية ولا تُرسل إلى الـ stream مرة أخرى
+selenium_jobs.JOB_BACKEND = "local"
+
+import telegram_sender
+from config import BOT_TOKEN
+from session_manager import ensure_session
+from ichancy_create_account import run_create_account_job
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# =========================
+# الإعدادات
+# =========================
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", os.getenv("BROWSER_POOL_SIZE", "2")))
+VISIBILITY_TIMEOUT_MS = selenium_jobs.VISIBILITY_TIMEOUT_MS
+MAX_DELIVERIES = int(os.getenv("JOB_MAX_DELIVERIES", "3"))
+CONSUMER_NAME = os.getenv("WORKER_NAME", f"{socket.gethostname()}-{os.getpid()}")
+
+# عمليات غير آمنة للإعادة: إعادة تسجيل نجح تفشل بـ "الاسم مستخدم" ويضيع الحساب المنشأ
+NON_RETRYABLE = {"create", "create_player"}
+
+bot = telebot.TeleBot(BOT_TOKEN, parse_mode="Markdown")
+telegram_sender.install(bot)
+stop_event = threading.Event()
+
+
+# =========================
+# معالجات المهام
+# =========================
+def handle_create(payload):
+    run_create_account_job(bot, payload)
+    return {"status": True}
+
+
+def handle_check(payload):
+    exists, data = ensure_session().check_player_exists(payload["username"], remote=payload.get("remote", False))
+    return {"exists": exists, "data": data}
+
+
+def handle_check_many(payload):
+    results, data = ensure_session().check_players_exist(payload["candidates"], query=payload.get("query"))
+    return {"results": results, "data": data}
+
+
+def handle_create_player(payload):
+    # المستدعي (IChancySession.create_player) جرّب HTTP وتحقق من الوجود قبل إرسال المهمة
+    with ensure_session().pool.acquire() as api:
+        status, data, player_id = api.create_player(payload["username"], payload["password"])
+    return {"status": status, "data": data, "player_id": player_id}
+
+
+def handle_login(payload):
+    if not ensure_session().relogin():
+        raise Exception("فشل تسجيل الدخول")
+    return {"status": True}
+
+
+HANDLERS = {
+    "create": handle_create,
+    "check": handle_check,
+    "check_many": handle_check_many,
+    "create_player": handle_create_player,
+    "login": handle_login,
+}
+
+
+# =========================
+# الاستهلاك
+# =========================
+def dead_letter(client, message_id, fields, error):
+    """نقل المهمة إلى stream الرسائل الميتة وإبلاغ المستدعي"""
+    logger.error(f"💀 نقل المهمة {fields.get('job_id')} ({fields.get('type')}) إلى dead-letter: {error}")
+    pipe = client.pipeline()
+    pipe.xadd(
+        selenium_jobs.REDIS_DEAD_STREAM_KEY,
+        dict(fields, error=str(error), failed_at=time.time(), original_id=message_id),
+        maxlen=selenium_jobs.STREAM_MAXLEN,
+        approximate=True,
+    )
+    pipe.xack(selenium_jobs.REDIS_STREAM_KEY, selenium_jobs.CONSUMER_GROUP, message_id)
+    pipe.execute()
+    selenium_jobs.publish_result(fields.get("job_id"), {"error": str(error)}, client)
+
+
+def process_message(client, message_id, fields, deliveries=1):
+    job_type = fields.get("type")
+    handler = HANDLERS.get(job_type)
+    if selenium_jobs.caller_gone(fields):
+        logger.warning(f"⌛ تجاهل المهمة {fields.get('job_id')} ({job_type}): المستدعي تجاوز مهلته")
+        client.xack(selenium_jobs.REDIS_STREAM_KEY, selenium_jobs.CONSUMER_GROUP, message_id)
+        return
+    if not handler:
+        dead_letter(client, message_id, fields, f"نوع مهمة غير معروف: {job_type}")
+        return
+
+    try:
+        payload = selenium_jobs.resolve_secrets(json.loads(fields.get("payload", "{}")), client)
+        result = handler(payload)
+    except Exception as e:
+        logger.error(f"❌ فشل المهمة {fields.get('job_id')} ({job_type}) المحاولة {deliveries}: {e}")
+        # مهمة ينتظرها مستدعٍ: الخطأ يُنشر له الآن ويقرر هو (الإعادة بعد مهلة الرؤية
+        # تأتي بعد انتهاء JOB_CALL_TIMEOUT فلا يستلمها أحد)
+        if job_type in NON_RETRYABLE or deliveries >= MAX_DELIVERIES or selenium_jobs.is_awaited(fields):
+            dead_letter(client, message_id, fields, e)
+        # غير ذلك تبقى في قائمة المعلقات ويعاد استلامها بعد انتهاء مهلة الرؤية
+        return
+
+    selenium_jobs.publish_result(fields.get("job_id"), result, client)
+    client.xack(selenium_jobs.REDIS_STREAM_KEY, selenium_jobs.CONSUMER_GROUP, message_id)
+
+
+def reclaim_stale(client, consumer):
+    """استلام المهام العالقة عند عمال متوقفين أو فاشلين"""
+    pending = client.xpending_range(
+        selenium_jobs.REDIS_STREAM_KEY,
+        selenium_jobs.CONSUMER_GROUP,
+        min="-",
+        max="+",
+        count=10,
+        idle=VISIBILITY_TIMEOUT_MS,
+    )
+    for entry in pending:
+        claimed = client.xclaim(
+            selenium_jobs.REDIS_STREAM_KEY,
+            selenium_jobs.CONSUMER_GROUP,
+            consumer,
+            VISIBILITY_TIMEOUT_MS,
+            [entry["message_id"]],
+        )
+        for message_id, fields in claimed:
+            if fields is None:
+                # حُذفت من الـ stream بسبب maxlen
+                client.xack(selenium_jobs.REDIS_STREAM_KEY, selenium_jobs.CONSUMER_GROUP, message_id)
+                continue
+            deliveries = entry["times_delivered"] + 1
+            if fields.get("type") in NON_RETRYABLE or deliveries > MAX_DELIVERIES:
+                dead_letter(client, message_id, fields, "تجاوزت المهمة عدد المحاولات أو انقطع العامل أثناءها")
+            else:
+                process_message(client, message_id, fields, deliveries)
+
+
+def consume_loop(index):
+    client = selenium_jobs.get_redis()
+    consumer = f"{CONSUMER_NAME}-{index}"
+    logger.info(f"👷 العامل {consumer} يستمع إلى {selenium_jobs.REDIS_STREAM_KEY}")
+    last_reclaim = 0
+
+    while not stop_event.is_set():
+        try:
+            if index == 0 and time.monotonic() - last_reclaim > VISIBILITY_TIMEOUT_MS / 3000:
+                reclaim_stale(client, consumer)
+                last_reclaim = time.monotonic()
+
+            response = client.xreadgroup(
+                selenium_jobs.CONSUMER_GROUP,
+                consumer,
+                {selenium_jobs.REDIS_STREAM_KEY: ">"},
+                count=1,
+                block=5000,
+            )
+            for _, messages in response or []:
+                for message_id, fields in messages:
+                    process_message(client, message_id, fields)
+        except Exception as e:
+            logger.error(f"❌ خطأ في حلقة العامل {consumer}: {e}")
+            time.sleep(2)
+
+
+def main():
+    selenium_jobs.ensure_group()
+    session = ensure_session()
+    session.start()
+    session.pool.start(prewarm=WORKER_THREADS)
+
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+
+    threads = [
+        threading.Thread(target=consume_loop, args=(i,), daemon=True, name=f"job-consumer-{i}")
+        for i in range(WORKER_THREADS)
+    ]
+    for t in threads:
+        t.start()
+
+    try:
+        while not stop_event.is_set():
+            stop_event.wait(1)
+    except KeyboardInterrupt:
+        stop_event.set()
+
+    logger.info("👋 إيقاف العامل...")
+    for t in threads:
+        t.join(timeout=10)
+    session.pool.close()
+
+
+if __name__ == "__main__":
+    main()
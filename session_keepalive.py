@@ -0,0 +1,107 @@
+# session_keepalive.py - إبقاء جلسة iChancy حية قبل انتهاء صلاحية الكوكيز
+import os
+import time
+import threading
+import logging
+import redis
+
+from ichancy_http_client import (
+    IChancyHTTPClient, HTTPClientError, SessionExpired, REDIS_SESSION_KEY, SESSION_TTL
+)
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# الإعدادات
+# =========================
+KEEPALIVE_INTERVAL = int(os.getenv("ICHANCY_KEEPALIVE_INTERVAL", "300"))
+REDIS_KEEPALIVE_LOCK_KEY = "ichancy:keepalive_lock"
+
+
+class SessionKeepalive:
+    """يلمس الجلسة دورياً ويمدد صلاحيتها، ويعيد تسجيل الدخول في وقت الخمول عند انتهائها"""
+
+    def __init__(self, redis_client, pool):
+        self.redis = redis_client
+        self.pool = pool
+        # بدون relogin: انتهاء الجلسة يظهر كاستثناء ونعالجه بالمجمع
+        self.http = IChancyHTTPClient(redis_client)
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_touch_at = None
+        self.last_relogin_at = None
+
+    def _relogin(self):
+        """تسجيل دخول استباقي بمتصفح خامل من المجمع"""
+        logger.info("🔄 تسجيل دخول استباقي قبل أن يحتاجه المستخدمون...")
+        with self.pool.acquire(timeout=5) as api:
+            api.is_logged_in = False
+            api.ensure_login()
+        self.last_relogin_at = time.time()
+
+    def tick(self):
+        """دورة واحدة (مرة واحدة على مستوى كل العمليات)"""
+        if not self.redis.set(REDIS_KEEPALIVE_LOCK_KEY, "1", nx=True, ex=max(1, KEEPALIVE_INTERVAL - 5)):
+            return
+
+        if not self.redis.exists(REDIS_SESSION_KEY):
+            self._relogin()
+            return
+
+        try:
+            # طلب خفيف يحدّث مؤقت خمول الجلسة على الخادم
+            self.http.search_players(None, limit=1)
+        except SessionExpired:
+            self._relogin()
+            return
+        except HTTPClientError as e:
+            logger.warning(f"⚠️ فشل لمس الجلسة: {e}")
+            return
+
+        # صلاحية منزلقة: الجلسة المستخدمة حديثاً لا تنتهي في Redis
+        self.redis.expire(REDIS_SESSION_KEY, SESSION_TTL)
+        self.last_touch_at = time.time()
+
+    def _run(self):
+        while not self._stop.wait(KEEPALIVE_INTERVAL):
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error(f"❌ خطأ في إبقاء الجلسة حية: {e}")
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="session-keepalive")
+        self._thread.start()
+        logger.info(f"💓 إبقاء الجلسة حية كل {KEEPALIVE_INTERVAL} ثانية")
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            "interval": KEEPALIVE_INTERVAL,
+            "session_ttl": self.redis.ttl(REDIS_SESSION_KEY),
+            "last_touch_at": self.last_touch_at,
+            "last_relogin_at": self.last_relogin_at,
+        }
+
+
+# =========================
+# النسخة المشتركة
+# =========================
+_keepalive = None
+_keepalive_lock = threading.Lock()
+
+
+def start_keepalive(pool):
+    """تشغيل إبقاء الجلسة حية مرة واحدة في هذه العملية"""
+    global _keepalive
+    with _keepalive_lock:
+        if _keepalive is None:
+            client = redis.from_url(os.getenv("REDIS_URL"), decode_responses=True)
+            _keepalive = SessionKeepalive(client, pool)
+        _keepalive.start()
+        return _keepalive
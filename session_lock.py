@@ -0,0 +1,110 @@
+# session_lock.py - قفل تسجيل دخول موزع مع fencing tokens
+import os
+import json
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# الإعدادات
+# =========================
+# أسوأ حالة لتسجيل الدخول = مجموع مهل الانتظار في IChancySeleniumAPI.login():
+# settle (15+15) + حقلا الدخول (15+15) + زر الدخول 15 + رد sign_in 15 + إعادة التوجيه 20
+# + settle (15+15) = 140ث، ويُضاف هامش للتنقل وتأخيرات humanize
+LOGIN_WORST_CASE_S = 140 + 40
+LOCK_TTL_MS = int(os.getenv("ICHANCY_LOGIN_LOCK_TTL_MS", str(LOGIN_WORST_CASE_S * 1000)))
+# المنتظرون لا يستسلمون قبل أن ينتهي قفل الفائز
+LOGIN_WAIT_TIMEOUT = float(os.getenv("ICHANCY_LOGIN_WAIT_TIMEOUT", str(LOCK_TTL_MS / 1000 + 10)))
+POLL_INTERVAL = 0.1
+
+# حذف القفل فقط إذا كان لا يزال لنا
+RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# تمديد القفل فقط إذا كان لا يزال لنا
+EXTEND_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# كتابة الجلسة فقط إذا كان القفل لا يزال يحمل نفس الـ token
+FENCED_SET_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+    return 1
+end
+return 0
+"""
+
+
+class LoginLock:
+    """قفل Redis يضمن تسجيل دخول واحد فقط على مستوى كل العمليات والمتصفحات"""
+
+    def __init__(self, redis_client, lock_key, session_key):
+        self.redis = redis_client
+        self.lock_key = lock_key
+        self.fence_key = f"{lock_key}:fence"
+        self.session_key = session_key
+        self._release = self.redis.register_script(RELEASE_LUA)
+        self._extend = self.redis.register_script(EXTEND_LUA)
+        self._fenced_set = self.redis.register_script(FENCED_SET_LUA)
+
+    def acquire(self):
+        """محاولة أخذ القفل - يعيد fencing token أو None إذا كان مع غيرنا"""
+        token = str(self.redis.incr(self.fence_key))
+        if self.redis.set(self.lock_key, token, nx=True, px=LOCK_TTL_MS):
+            logger.info(f"🔒 أخذنا قفل تسجيل الدخول (token {token})")
+            return token
+        return None
+
+    def release(self, token):
+        if token:
+            self._release(keys=[self.lock_key], args=[token])
+
+    def extend(self, token, ttl_ms=LOCK_TTL_MS):
+        """إعادة ضبط مدة القفل أثناء تسجيل دخول طويل - False إذا لم يعد لنا"""
+        if not token:
+            return False
+        extended = self._extend(keys=[self.lock_key], args=[token, ttl_ms])
+        if not extended:
+            logger.error(f"❌ فقدنا قفل تسجيل الدخول (token {token}) قبل انتهاء الدخول")
+        return bool(extended)
+
+    def save_session(self, token, payload, ttl):
+        """حفظ الجلسة بشرط أن نكون لا نزال أصحاب القفل (fencing)"""
+        if not token:
+            raise ValueError("حفظ الجلسة يتطلب fencing token من acquire()")
+        saved = self._fenced_set(keys=[self.lock_key, self.session_key], args=[token, payload, ttl])
+        if not saved:
+            logger.error(f"❌ رُفض حفظ الجلسة: token {token} قديم (القفل انتهى أو أخذته عملية أخرى)")
+        return bool(saved)
+
+    def session_stamp(self):
+        """توقيت الجلسة الحالية في Redis (لمعرفة متى يحفظ الفائز جلسة جديدة)"""
+        data = self.redis.get(self.session_key)
+        if not data:
+            return None
+        try:
+            return json.loads(data).get("timestamp")
+        except ValueError:
+            return None
+
+    def wait_for_session(self, old_stamp, timeout=LOGIN_WAIT_TIMEOUT):
+        """انتظار أن يحفظ صاحب القفل جلسة جديدة - False إذا فشل أو انتهت المهلة"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            stamp = self.session_stamp()
+            if stamp and stamp != old_stamp:
+                return True
+            if not self.redis.exists(self.lock_key):
+                # تحرر القفل دون جلسة جديدة: الفائز فشل
+                return self.session_stamp() not in (None, old_stamp)
+            time.sleep(POLL_INTERVAL)
+        return False
@@ -0,0 +1,231 @@
+# session_manager.py - نقطة الدخول الوحيدة لجلسة iChancy في العملية
+import os
+import time
+import threading
+import logging
+import redis
+
+import selenium_jobs
+from browser_pool import get_pool
+from players_index import get_players_index
+from session_keepalive import start_keepalive
+from ichancy_http_client import (
+    IChancyHTTPClient, HTTPClientError, UnknownOutcome, RequestNotSent, SessionExpired
+)
+
+logger = logging.getLogger(__name__)
+
+
+class IChancySession:
+    """يملك عميل HTTP ومجمع المتصفحات للعملية: HTTP أولاً والمتصفح عند الحاجة فقط"""
+
+    def __init__(self):
+        self.redis = redis.from_url(os.getenv("REDIS_URL"), decode_responses=True)
+        self.pool = get_pool()
+        self.index = get_players_index(self.redis, relogin=self.relogin)
+        self.http = IChancyHTTPClient(self.redis, relogin=self.relogin)
+
+        self.created_at = time.time()
+        self.last_login_at = None
+        self.last_error = None
+        self.healthy = True
+        self._started = False
+        self._lock = threading.Lock()
+
+    # =========================
+    # التشغيل
+    # =========================
+    def start(self):
+        """تشغيل الخدمات الخلفية (المتصفحات تُنشأ عند أول حاجة في وضع stream)"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+
+        if selenium_jobs.use_stream():
+            logger.info("🧵 مهام المتصفح تُنفذ في عمال منفصلين (JOB_BACKEND=stream)")
+            return
+
+        self.pool.start(prewarm=1)
+        self.index.start_background_sync()
+        start_keepalive(self.pool)
+
+    # =========================
+    # الحالة
+    # =========================
+    def _ok(self):
+        self.healthy = True
+        self.last_error = None
+
+    def _failed(self, error):
+        self.healthy = False
+        self.last_error = str(error)
+
+    def relogin(self):
+        """تسجيل دخول عبر متصفح (محلي أو في عامل) - يُستدعى من عميل HTTP عند انتهاء الجلسة"""
+        try:
+            if selenium_jobs.use_stream():
+                reply = selenium_jobs.call("login", {})
+                if reply.get("error"):
+                    raise Exception(reply["error"])
+            else:
+                with self.pool.acquire() as api:
+                    api.is_logged_in = False
+                    api.ensure_login()
+            self.last_login_at = time.time()
+            self._ok()
+            return True
+        except Exception as e:
+            logger.error(f"❌ فشل تسجيل الدخول: {e}")
+            self._failed(e)
+            return False
+
+    def stats(self):
+        return {
+            "healthy": self.healthy,
+            "last_error": self.last_error,
+            "last_login_at": self.last_login_at,
+            "http_last_success_at": self.http.last_success_at or None,
+            "uptime": round(time.time() - self.created_at),
+            "backend": selenium_jobs.JOB_BACKEND,
+            "browser_pool": None if selenium_jobs.use_stream() else self.pool.stats(),
+        }
+
+    def is_ready(self):
+        if selenium_jobs.use_stream():
+            return self.healthy
+        return self.pool.is_ready()
+
+    # =========================
+    # اللاعبين
+    # =========================
+    def check_player_exists(self, username, remote=False):
+        if not remote:
+            exists = self.index.exists(username)
+            if exists is not None:
+                return exists, {"exists": exists, "source": "index"}
+
+        try:
+            result = self.http.check_player_exists(username)
+            self._ok()
+            return result
+        except HTTPClientError as e:
+            logger.warning(f"⚠️ فشل التحقق عبر HTTP، الرجوع إلى المتصفح: {e}")
+
+        if selenium_jobs.use_stream():
+            reply = selenium_jobs.call("check", {"username": username, "remote": True})
+            return reply.get("exists", False), reply.get("data", reply)
+
+        with self.pool.acquire() as api:
+            return api.check_player_exists(username, remote=True, http_first=False)
+
+    def check_players_exist(self, candidates, query=None):
+        candidates = list(candidates)
+        results = self.index.exists_many(candidates)
+        if results is not None:
+            return results, {"source": "index"}
+
+        try:
+            results = self.http.check_players_exist(candidates, query)
+            self._ok()
+            return results, {"source": "http"}
+        except HTTPClientError as e:
+            logger.warning(f"⚠️ فشل التحقق الجماعي عبر HTTP، الرجوع إلى المتصفح: {e}")
+
+        if selenium_jobs.use_stream():
+            reply = selenium_jobs.call("check_many", {"candidates": candidates, "query": query})
+            return reply.get("results", {}), reply.get("data", reply)
+
+        with self.pool.acquire() as api:
+            return api.check_players_exist(candidates, query=query, http_first=False)
+
+    def _create_player_browser(self, username, password, progress=None):
+        if selenium_jobs.use_stream():
+            reply = selenium_jobs.call("create_player", {"username": username, "password": password})
+            return reply.get("status", 500), reply.get("data", reply), reply.get("player_id")
+        with self.pool.acquire() as api:
+            return api.create_player(username, password, progress=progress)
+
+    def create_player(self, username, password, progress=None):
+        try:
+            if progress:
+                progress("submit")
+            status, data, player_id = self.http.create_player(username, password)
+            self._ok()
+        except (RequestNotSent, SessionExpired) as e:
+            # الطلب لم يصل إلى الخادم: الإعادة عبر المتصفح آمنة
+            logger.warning(f"⚠️ فشل الإنشاء عبر HTTP، الرجوع إلى المتصفح: {e}")
+            return self._create_player_browser(username, password, progress)
+        except HTTPClientError as e:
+            # ربما أُنشئ اللاعب (انقطاع بعد الإرسال): نتحقق قبل أي إعادة
+            logger.warning(f"⚠️ نتيجة إنشاء '{username}' غير معروفة، التحقق قبل الإعادة: {e}")
+            exists, extra = self.check_player_exists(username, remote=True)
+            if "error" in extra:
+                return 500, {"status": False, "error": "تعذر التأكد من إنشاء الحساب، حاول لاحقاً"}, None
+            if not exists:
+                return self._create_player_browser(username, password, progress)
+            status, player_id = 200, extra.get("player_id")
+            data = {
+                "status": True,
+                "message": "تم إنشاء اللاعب بنجاح",
+                "username": username,
+                "email": f"{username}@player.ichancy.com",
+            }
+
+        if status == 200:
+            self.index.add(username, player_id)
+        return status, data, player_id
+
+    # =========================
+    # الرصيد
+    # =========================
+    def get_player_balance(self, player_id):
+        try:
+            result = self.http.get_player_balance(player_id)
+            self._ok()
+            return result
+        except HTTPClientError as e:
+            logger.error(f"❌ فشل جلب رصيد اللاعب: {e}")
+            self._failed(e)
+            return 500, {"error": str(e)}, 0.0
+
+    def _transfer(self, transfer, player_id, amount):
+        """تحويل واحد دون أي إعادة - النتيجة الغامضة تُعاد كـ unknown_outcome للمطابقة"""
+        try:
+            result = transfer(player_id, amount)
+            self._ok()
+            return result
+        except UnknownOutcome as e:
+            logger.critical(f"🚨 نتيجة تحويل غير معروفة (لاعب {player_id}، مبلغ {amount}): {e}")
+            return 504, {
+                "error": str(e),
+                "unknown_outcome": True,
+                "notification": [{"content": "⏳ لم نتأكد من نتيجة العملية، سيتم مراجعتها"}]
+            }
+        except HTTPClientError as e:
+            logger.error(f"❌ فشل التحويل للاعب {player_id}: {e}")
+            self._failed(e)
+            return 500, {"error": str(e), "notification": [{"content": str(e)}]}
+
+    def deposit_to_player(self, player_id, amount):
+        return self._transfer(self.http.deposit_to_player, player_id, amount)
+
+    def withdraw_from_player(self, player_id, amount):
+        return self._transfer(self.http.withdraw_from_player, player_id, amount)
+
+
+# =========================
+# النسخة المشتركة
+# =========================
+_session = None
+_session_lock = threading.Lock()
+
+
+def ensure_session():
+    """الحصول على جلسة iChancy المشتركة في هذه العملية (تُنشأ عند أول استخدام)"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            logger.info("🚀 تهيئة جلسة IChancy...")
+            _session = IChancySession()
+        return _session
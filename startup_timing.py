@@ -0,0 +1,46 @@
+# startup_timing.py - تسجيل مراحل الإقلاع لقياس زمن التشغيل البارد
+import os
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def _process_started_at():
+    """وقت بدء العملية من /proc (يشمل زمن تحميل المفسر والاستيرادات قبل هذه الوحدة)"""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - uptime + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+
+PROCESS_STARTED_AT = _process_started_at()
+
+_events = {}
+_lock = threading.Lock()
+
+
+def mark(event):
+    """تسجيل أول حدوث لمرحلة (بالثواني منذ بدء العملية)"""
+    with _lock:
+        if event in _events:
+            return
+        elapsed = round(time.time() - PROCESS_STARTED_AT, 3)
+        _events[event] = elapsed
+    logger.info(f"⏱️ {event}: {elapsed}s منذ الإقلاع")
+
+
+def report():
+    with _lock:
+        events = dict(sorted(_events.items(), key=lambda item: item[1]))
+    return {
+        "pid": os.getpid(),
+        "process_started_at": round(PROCESS_STARTED_AT, 3),
+        "uptime": round(time.time() - PROCESS_STARTED_AT),
+        "events": events,
+    }
@@ -0,0 +1,343 @@
+# telegram_sender.py - محدد معدل الإرسال إلى Telegram مع احترام retry_after ودمج التعديلات
+import os
+import time
+import asyncio
+import logging
+import threading
+from functools import wraps
+
+from telebot.apihelper import ApiTelegramException
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# الإعدادات
+# =========================
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))   # رسالة/ثانية للبوت كله
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))        # رسالة/ثانية لكل محادثة
+TELEGRAM_CHAT_BURST = float(os.getenv("TELEGRAM_CHAT_BURST", "3"))
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", "3"))
+TELEGRAM_SEND_TIMEOUT = float(os.getenv("TELEGRAM_SEND_TIMEOUT", "30"))  # أقصى انتظار لدور الإرسال
+
+CHAT_BUCKETS_MAX = 10000
+CHAT_BUCKET_IDLE = 300
+
+# الدوال المغلفة: (موقع chat_id، موقع message_id أو None) في الوسائط الموضعية
+SEND_METHODS = {
+    "send_message": (0, None),
+    "send_photo": (0, None),
+    "send_document": (0, None),
+    "edit_message_text": (1, 2),
+    "edit_message_reply_markup": (0, 1),
+}
+
+
+def _call_keys(chat_pos, message_pos, args, kwargs):
+    """(chat_id, مفتاح التعديل أو None) من وسائط استدعاء الإرسال"""
+    chat_id = kwargs.get("chat_id", args[chat_pos] if len(args) > chat_pos else None)
+    edit_key = None
+    if message_pos is not None:
+        message_id = kwargs.get("message_id", args[message_pos] if len(args) > message_pos else None)
+        if chat_id is not None and message_id is not None:
+            edit_key = (chat_id, message_id)
+    return chat_id, edit_key
+
+
+class TokenBucket:
+    """دلو رموز: rate رمز/ثانية بسعة capacity"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _take(self):
+        """أخذ رمز إن توفر - يعيد 0 عند النجاح أو مدة الانتظار المطلوبة"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now >= self.paused_until and self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return max(self.paused_until - now, (1 - self.tokens) / self.rate)
+
+    @staticmethod
+    def _bounded(wait, deadline):
+        """مدة الانتظار مقيدة بالمهلة، أو None إذا انتهت"""
+        if deadline is None:
+            return wait
+        remaining = deadline - time.monotonic()
+        return min(wait, remaining) if remaining > 0 else None
+
+    def acquire(self, timeout=None):
+        """أخذ رمز (ينتظر حتى يتوفر) - False عند انتهاء المهلة"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            wait = self._bounded(wait, deadline)
+            if wait is None:
+                return False
+            time.sleep(wait)
+
+    async def acquire_async(self, timeout=None):
+        """مثل acquire لكن الانتظار في حلقة asyncio بدل حجز thread"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            wait = self._bounded(wait, deadline)
+            if wait is None:
+                return False
+            await asyncio.sleep(wait)
+
+    def refund(self):
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+    def pause(self, seconds):
+        """إيقاف الدلو بعد 429 حتى تنتهي مدة retry_after"""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+    def idle_for(self, now):
+        return now - self.updated
+
+
+class TelegramSender:
+    """يمرر كل إرسال عبر دلو عام ودلو للمحادثة، ويعيد المحاولة بعد 429، ويدمج التعديلات المتتالية"""
+
+    def __init__(self, global_rate=TELEGRAM_GLOBAL_RATE, chat_rate=TELEGRAM_CHAT_RATE,
+                 chat_burst=TELEGRAM_CHAT_BURST, max_retries=TELEGRAM_MAX_RETRIES):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+
+        self._chats = {}
+        self._edits = {}  # (chat_id, message_id) -> أحدث إصدار
+        self._lock = threading.Lock()
+
+        self.sent = 0
+        self.retried = 0
+        self.coalesced = 0
+        self.deferred = 0
+        self.failed = 0
+
+    def _chat_bucket(self, chat_id):
+        with self._lock:
+            bucket = self._chats.get(chat_id)
+            if bucket is None:
+                if len(self._chats) >= CHAT_BUCKETS_MAX:
+                    now = time.monotonic()
+                    for key in [k for k, b in self._chats.items() if b.idle_for(now) > CHAT_BUCKET_IDLE]:
+                        del self._chats[key]
+                bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+            return bucket
+
+    def _edit_version(self, edit_key):
+        with self._lock:
+            version = self._edits.get(edit_key, 0) + 1
+            self._edits[edit_key] = version
+            return version
+
+    def _superseded(self, edit_key, version):
+        with self._lock:
+            return self._edits.get(edit_key) != version
+
+    def _done_edit(self, edit_key, version):
+        with self._lock:
+            if self._edits.get(edit_key) == version:
+                del self._edits[edit_key]
+
+    def call(self, method, chat_id, edit_key, *args, **kwargs):
+        """تنفيذ استدعاء إرسال مع احترام الحدود"""
+        version = self._edit_version(edit_key) if edit_key else None
+        return self._send(method, chat_id, edit_key, version, 0, args, kwargs)
+
+    def _send(self, method, chat_id, edit_key, version, first_attempt, args, kwargs):
+        chat_bucket = self._chat_bucket(chat_id) if chat_id is not None else None
+        deferred = False
+
+        try:
+            for attempt in range(first_attempt, self.max_retries + 1):
+                if chat_bucket and not chat_bucket.acquire(TELEGRAM_SEND_TIMEOUT):
+                    raise TimeoutError(f"انتهت مهلة انتظار الإرسال للمحادثة {chat_id}")
+
+                # تعديل أحدث لنفس الرسالة وصل أثناء الانتظار: هذا التعديل لم يعد له معنى
+                if version and self._superseded(edit_key, version):
+                    chat_bucket.refund()
+                    with self._lock:
+                        self.coalesced += 1
+                    return None
+
+                self.global_bucket.acquire()
+                try:
+                    result = method(*args, **kwargs)
+                    with self._lock:
+                        self.sent += 1
+                    return result
+                except ApiTelegramException as e:
+                    if e.error_code == 429 and attempt < self.max_retries:
+                        retry_after = self._retry_after(e)
+                        logger.warning(f"⏳ Telegram 429 للمحادثة {chat_id}: انتظار {retry_after}ث")
+                        (chat_bucket or self.global_bucket).pause(retry_after)
+                        with self._lock:
+                            self.retried += 1
+                        if version:
+                            # لا أحد ينتظر نتيجة التعديل: يُعاد من مؤقت ويتحرر مسار المستخدم فوراً
+                            deferred = True
+                            self._defer(retry_after, method, chat_id, edit_key, version, attempt + 1, args, kwargs)
+                            return None
+                        # الرسائل الجديدة يحتاج المستدعي نتيجتها (message_id) فتنتظر هنا
+                        if chat_bucket is None:
+                            time.sleep(retry_after)
+                        continue
+                    if e.error_code == 400 and "message is not modified" in str(e):
+                        return None
+                    with self._lock:
+                        self.failed += 1
+                    raise
+        finally:
+            if version and not deferred:
+                self._done_edit(edit_key, version)
+
+    @staticmethod
+    def _retry_after(e):
+        return (getattr(e, "result_json", None) or {}).get("parameters", {}).get("retry_after", 1)
+
+    async def call_async(self, method, chat_id, edit_key, *args, **kwargs):
+        """نفس call لـ AsyncTeleBot: نفس الدلاء (نفس التوكن) والانتظار بـ asyncio.sleep"""
+        version = self._edit_version(edit_key) if edit_key else None
+        chat_bucket = self._chat_bucket(chat_id) if chat_id is not None else None
+
+        try:
+            for attempt in range(self.max_retries + 1):
+                if chat_bucket and not await chat_bucket.acquire_async(TELEGRAM_SEND_TIMEOUT):
+                    raise TimeoutError(f"انتهت مهلة انتظار الإرسال للمحادثة {chat_id}")
+
+                if version and self._superseded(edit_key, version):
+                    chat_bucket.refund()
+                    with self._lock:
+                        self.coalesced += 1
+                    return None
+
+                await self.global_bucket.acquire_async()
+                try:
+                    result = await method(*args, **kwargs)
+                    with self._lock:
+                        self.sent += 1
+                    return result
+                except Exception as e:
+                    # asyncio_helper له ApiTelegramException خاص به: نعتمد على error_code
+                    code = getattr(e, "error_code", None)
+                    if code == 429 and attempt < self.max_retries:
+                        retry_after = self._retry_after(e)
+                        logger.warning(f"⏳ Telegram 429 للمحادثة {chat_id}: انتظار {retry_after}ث")
+                        (chat_bucket or self.global_bucket).pause(retry_after)
+                        with self._lock:
+                            self.retried += 1
+                        continue
+                    if code == 400 and "message is not modified" in str(e):
+                        return None
+                    if code is not None:
+                        with self._lock:
+                            self.failed += 1
+                    raise
+        finally:
+            if version:
+                self._done_edit(edit_key, version)
+
+    def _defer(self, delay, *send_args):
+        """جدولة إعادة الإرسال بعد retry_after في thread مؤقت"""
+        timer = threading.Timer(delay, self._run_deferred, send_args)
+        timer.daemon = True
+        timer.start()
+        with self._lock:
+            self.deferred += 1
+
+    def _run_deferred(self, *send_args):
+        try:
+            self._send(*send_args)
+        except Exception as e:
+            logger.error(f"❌ فشل إعادة إرسال مؤجلة: {e}")
+
+    def wrap(self, name, method):
+        chat_pos, message_pos = SEND_METHODS[name]
+
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            chat_id, edit_key = _call_keys(chat_pos, message_pos, args, kwargs)
+            return self.call(method, chat_id, edit_key, *args, **kwargs)
+
+        return wrapper
+
+    def wrap_async(self, name, method):
+        chat_pos, message_pos = SEND_METHODS[name]
+
+        @wraps(method)
+        async def wrapper(*args, **kwargs):
+            chat_id, edit_key = _call_keys(chat_pos, message_pos, args, kwargs)
+            return await self.call_async(method, chat_id, edit_key, *args, **kwargs)
+
+        return wrapper
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sent": self.sent,
+                "retried_429": self.retried,
+                "coalesced_edits": self.coalesced,
+                "deferred_edits": self.deferred,
+                "failed": self.failed,
+                "chats": len(self._chats),
+            }
+
+
+# =========================
+# النسخة المشتركة
+# =========================
+_sender = None
+_sender_lock = threading.Lock()
+
+
+def get_sender():
+    global _sender
+    with _sender_lock:
+        if _sender is None:
+            _sender = TelegramSender()
+        return _sender
+
+
+def install(bot):
+    """تغليف دوال الإرسال في البوت حتى تمر كل الاستدعاءات الحالية عبر المحدد"""
+    sender = get_sender()
+    _install(bot, sender.wrap)
+    return sender
+
+
+def install_async(bot):
+    """مثل install لـ AsyncTeleBot - يشارك نفس الدلاء مع البوت المتزامن في العملية"""
+    sender = get_sender()
+    _install(bot, sender.wrap_async)
+    return sender
+
+
+def _install(bot, wrap):
+    for name in SEND_METHODS:
+        method = getattr(bot, name)
+        if getattr(method, "_rate_limited", False):
+            continue
+        wrapper = wrap(name, method)
+        wrapper._rate_limited = True
+        setattr(bot, name, wrapper)
@@ -0,0 +1,5 @@
+# الوحدات في جذر المستودع (بدون حزمة): إضافته إلى المسار حتى تُستورد في الاختبارات
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
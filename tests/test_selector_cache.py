@@ -0,0 +1,79 @@
+from selector_cache import (
+    SelectorCache, next_score, HIT_SCORE, MISS_SCORE, SCORE_MIN, SCORE_MAX, _key,
+)
+
+A = ("css", "#a")
+B = ("css", "#b")
+C = ("css", "#c")
+
+
+class FakeRedis:
+    """زوج zrange/register_script فقط: ما يحتاجه SelectorCache"""
+
+    def __init__(self, scores=None):
+        self.scores = scores or {}
+        self.bumps = []
+
+    def zrange(self, key, start, end, withscores=False):
+        return sorted(self.scores.items(), key=lambda kv: kv[1])
+
+    def register_script(self, script):
+        def run(keys, args):
+            self.bumps.append((keys, args))
+        return run
+
+
+def test_next_score_clamps_to_range():
+    score = 0
+    for _ in range(100):
+        score = next_score(score, HIT_SCORE)
+    assert score == SCORE_MAX
+    for _ in range(100):
+        score = next_score(score, MISS_SCORE)
+    assert score == SCORE_MIN
+
+
+def test_next_score_resets_on_direction_change():
+    assert next_score(SCORE_MAX, MISS_SCORE) == MISS_SCORE
+    assert next_score(SCORE_MIN, HIT_SCORE) == HIT_SCORE
+    assert next_score(2, HIT_SCORE) == 3
+
+
+def test_single_miss_drops_proven_selector_below_untried():
+    cache = SelectorCache(FakeRedis({_key(A): SCORE_MAX}))
+    assert cache.order("f", [B, A]) == [A, B]
+    cache.miss("f", A)
+    assert cache.order("f", [A, B]) == [B, A]
+
+
+def test_order_keeps_original_order_on_ties():
+    cache = SelectorCache(FakeRedis())
+    assert cache.order("f", [C, A, B]) == [C, A, B]
+
+
+def test_order_ranks_by_score():
+    cache = SelectorCache(FakeRedis({_key(A): -2, _key(B): 3}))
+    assert cache.order("f", [A, B, C]) == [B, C, A]
+
+
+def test_bump_sends_clamp_bounds_to_redis():
+    fake = FakeRedis()
+    cache = SelectorCache(fake)
+    cache.hit("f", A)
+    keys, args = fake.bumps[0]
+    assert keys == ["ichancy:selectors:f", "ichancy:selectors:f:hits"]
+    assert args == [_key(A), HIT_SCORE, SCORE_MIN, SCORE_MAX]
+
+
+def test_redis_errors_do_not_break_ordering():
+    class Broken:
+        def zrange(self, *a, **kw):
+            raise ConnectionError("down")
+
+        def register_script(self, script):
+            raise ConnectionError("down")
+
+    cache = SelectorCache(Broken())
+    assert cache.order("f", [A, B]) == [A, B]
+    cache.miss("f", A)
+    assert cache.order("f", [A, B]) == [B, A]
@@ -0,0 +1,94 @@
+import time
+import threading
+
+import pytest
+
+pytest.importorskip("telebot")
+
+from telebot.apihelper import ApiTelegramException
+
+from telegram_sender import TokenBucket, TelegramSender
+
+
+def too_many_requests(retry_after):
+    result = {"ok": False, "error_code": 429, "description": "Too Many Requests",
+              "parameters": {"retry_after": retry_after}}
+    return ApiTelegramException("sendMessage", None, result)
+
+
+def test_bucket_allows_burst_then_throttles():
+    bucket = TokenBucket(rate=10, capacity=3)
+    assert all(bucket.acquire(timeout=0) for _ in range(3))
+    assert not bucket.acquire(timeout=0)
+    started = time.monotonic()
+    assert bucket.acquire(timeout=1)
+    assert time.monotonic() - started >= 0.05
+
+
+def test_bucket_pause_blocks_until_retry_after():
+    bucket = TokenBucket(rate=100, capacity=5)
+    bucket.pause(0.2)
+    assert not bucket.acquire(timeout=0.05)
+    assert bucket.acquire(timeout=1)
+
+
+def test_refund_returns_token():
+    bucket = TokenBucket(rate=0.001, capacity=1)
+    assert bucket.acquire(timeout=0)
+    bucket.refund()
+    assert bucket.acquire(timeout=0)
+
+
+def test_edit_429_is_deferred_without_blocking_caller():
+    sender = TelegramSender(global_rate=100, chat_rate=100, chat_burst=10)
+    done = threading.Event()
+    calls = []
+
+    def edit(*args):
+        calls.append(args)
+        if len(calls) == 1:
+            raise too_many_requests(0.2)
+        done.set()
+        return "ok"
+
+    started = time.monotonic()
+    assert sender.call(edit, 1, (1, 10), "text") is None
+    assert time.monotonic() - started < 0.1
+    assert done.wait(2)
+    assert sender.stats()["deferred_edits"] == 1
+
+
+def test_deferred_edit_dropped_when_superseded():
+    sender = TelegramSender(global_rate=100, chat_rate=100, chat_burst=10)
+    calls = []
+
+    def edit(text):
+        calls.append(text)
+        if text == "old":
+            raise too_many_requests(0.1)
+
+    sender.call(edit, 1, (1, 10), "old")
+    sender.call(edit, 1, (1, 10), "new")
+    time.sleep(0.4)
+    assert calls.count("old") == 1
+    assert sender.stats()["coalesced_edits"] == 1
+
+
+def test_async_send_retries_429_and_shares_buckets():
+    import asyncio
+
+    sender = TelegramSender(global_rate=100, chat_rate=100, chat_burst=10)
+    calls = []
+
+    async def send(chat_id, text):
+        calls.append(text)
+        if len(calls) == 1:
+            raise too_many_requests(0.05)
+        return "sent"
+
+    wrapped = sender.wrap_async("send_message", send)
+    assert asyncio.run(wrapped(1, "hi")) == "sent"
+    stats = sender.stats()
+    assert stats["retried_429"] == 1
+    assert stats["sent"] == 1
+    assert stats["chats"] == 1
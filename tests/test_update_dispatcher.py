@@ -0,0 +1,107 @@
+import time
+import threading
+from types import SimpleNamespace
+
+from update_dispatcher import KeyedDispatcher, update_key
+
+
+def message_update(user_id, update_id=1):
+    return SimpleNamespace(
+        update_id=update_id,
+        message=SimpleNamespace(from_user=SimpleNamespace(id=user_id)),
+    )
+
+
+def wait_idle(dispatcher, timeout=2):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stats = dispatcher.stats()
+        if stats["pending"] == 0 and stats["active_lanes"] == 0:
+            return stats
+        time.sleep(0.01)
+    raise AssertionError("المُوزّع لم ينتهِ")
+
+
+def test_update_key_uses_sender_or_update_id():
+    assert update_key(message_update(42)) == 42
+    assert update_key(SimpleNamespace(update_id=7)) == "update:7"
+
+
+def test_same_key_runs_in_order():
+    handled = []
+
+    def handler(item):
+        time.sleep(0.005)
+        handled.append(item)
+
+    dispatcher = KeyedDispatcher(handler, workers=4)
+    for i in range(20):
+        dispatcher.submit(i, key="user")
+    wait_idle(dispatcher)
+    assert handled == list(range(20))
+
+
+def test_same_key_never_overlaps():
+    active, overlaps = [0], []
+    lock = threading.Lock()
+
+    def handler(item):
+        with lock:
+            active[0] += 1
+            overlaps.append(active[0])
+        time.sleep(0.01)
+        with lock:
+            active[0] -= 1
+
+    dispatcher = KeyedDispatcher(handler, workers=4)
+    for i in range(5):
+        dispatcher.submit(i, key="user")
+    wait_idle(dispatcher)
+    assert max(overlaps) == 1
+
+
+def test_different_keys_run_in_parallel():
+    barrier = threading.Barrier(3, timeout=1)
+
+    def handler(item):
+        # ينجح فقط إذا كانت المسارات الثلاثة تعمل في نفس الوقت
+        barrier.wait()
+
+    dispatcher = KeyedDispatcher(handler, workers=3)
+    for key in ("a", "b", "c"):
+        dispatcher.submit(key, key=key)
+    stats = wait_idle(dispatcher)
+    assert stats["processed"] == 3
+    assert stats["failed"] == 0
+
+
+def test_slow_user_does_not_block_others():
+    gate = threading.Event()
+    handled = []
+
+    def handler(item):
+        if item == "slow":
+            gate.wait(2)
+        handled.append(item)
+
+    dispatcher = KeyedDispatcher(handler, workers=2)
+    dispatcher.submit("slow", key="a")
+    dispatcher.submit("fast", key="b")
+    time.sleep(0.1)
+    assert handled == ["fast"]
+    gate.set()
+    wait_idle(dispatcher)
+    assert handled == ["fast", "slow"]
+
+
+def test_failures_are_counted_and_lane_continues():
+    def handler(item):
+        if item == "bad":
+            raise ValueError("boom")
+
+    dispatcher = KeyedDispatcher(handler, workers=1)
+    dispatcher.submit("bad", key="u")
+    dispatcher.submit("good", key="u")
+    stats = wait_idle(dispatcher)
+    assert stats["failed"] == 1
+    assert stats["processed"] == 1
@@ -0,0 +1,97 @@
+import threading
+
+from update_queue import UpdateQueue
+
+
+def blocked_queue(policy, maxsize=2, block_timeout=0.1):
+    """طابور بعامل واحد عالق في أول تحديث حتى يُحرر gate"""
+    gate = threading.Event()
+    started = threading.Event()
+    handled = []
+
+    def handler(update):
+        started.set()
+        gate.wait(2)
+        handled.append(update)
+
+    queue = UpdateQueue(handler, workers=1, maxsize=maxsize, policy=policy, block_timeout=block_timeout)
+    queue.put("busy")
+    assert started.wait(1)
+    return queue, gate, handled
+
+
+def drain(queue, gate, expected):
+    gate.set()
+    for _ in range(200):
+        stats = queue.stats()
+        if stats["processed"] + stats["failed"] >= expected:
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError("الطابور لم يفرغ")
+
+
+def test_single_worker_keeps_fifo_order():
+    queue, gate, handled = blocked_queue("drop_new", maxsize=10)
+    for i in range(5):
+        assert queue.put(i)
+    drain(queue, gate, 6)
+    assert handled == ["busy", 0, 1, 2, 3, 4]
+
+
+def test_drop_new_rejects_when_full():
+    queue, gate, handled = blocked_queue("drop_new")
+    assert queue.put(1)
+    assert queue.put(2)
+    assert not queue.put(3)
+    drain(queue, gate, 3)
+    assert handled == ["busy", 1, 2]
+    assert queue.stats()["dropped"] == 1
+
+
+def test_drop_oldest_evicts_head():
+    queue, gate, handled = blocked_queue("drop_oldest")
+    for i in (1, 2, 3):
+        assert queue.put(i)
+    drain(queue, gate, 3)
+    assert handled == ["busy", 2, 3]
+    assert queue.stats()["dropped"] == 1
+
+
+def test_block_times_out_and_drops():
+    queue, gate, handled = blocked_queue("block", block_timeout=0.05)
+    assert queue.put(1)
+    assert queue.put(2)
+    assert not queue.put(3)
+    stats = queue.stats()
+    assert stats["dropped"] == 1
+    assert stats["high_watermark"] == 2
+    drain(queue, gate, 3)
+
+
+def test_block_waits_for_free_slot():
+    queue, gate, handled = blocked_queue("block", block_timeout=2)
+    queue.put(1)
+    queue.put(2)
+    threading.Timer(0.05, gate.set).start()
+    assert queue.put(3)
+    drain(queue, gate, 4)
+    assert handled == ["busy", 1, 2, 3]
+
+
+def test_unknown_policy_falls_back_to_drop_oldest():
+    queue = UpdateQueue(lambda u: None, workers=1, policy="bogus")
+    assert queue.policy == "drop_oldest"
+
+
+def test_handler_errors_are_counted_not_fatal():
+    def handler(update):
+        if update == "bad":
+            raise ValueError("boom")
+
+    queue, gate = UpdateQueue(handler, workers=1), threading.Event()
+    queue.put("bad")
+    queue.put("good")
+    drain(queue, gate, 2)
+    stats = queue.stats()
+    assert stats["failed"] == 1
+    assert stats["processed"] == 1
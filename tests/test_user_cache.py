@@ -0,0 +1,94 @@
+import pytest
+
+pytest.importorskip("pymongo")
+
+import db
+
+
+class FakeUsers:
+    """مجموعة users وهمية: find_one يعيد المستند ويعد الاستدعاءات"""
+
+    def __init__(self, doc, during_read=None):
+        self.doc = doc
+        self.reads = 0
+        self.during_read = during_read
+
+    def find_one(self, query):
+        self.reads += 1
+        doc = dict(self.doc)
+        if self.during_read:
+            # كتابة متزامنة تصل بعد أن قرأنا المستند القديم
+            self.during_read()
+        return doc
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(db, "USER_CACHE_REDIS", False)
+    monkeypatch.setattr(db, "USER_CACHE_SIZE", 3)
+    monkeypatch.setattr(db, "_user_cache", db.OrderedDict())
+    monkeypatch.setattr(db, "_user_generations", {})
+    monkeypatch.setattr(db, "_user_cache_stats", dict.fromkeys(db._user_cache_stats, 0))
+    monkeypatch.setattr(db, "db", object())
+
+
+def use_users(monkeypatch, users):
+    monkeypatch.setattr(db, "users", users)
+    return users
+
+
+def test_second_read_is_served_from_cache(monkeypatch):
+    users = use_users(monkeypatch, FakeUsers({"telegram_id": 1, "balance": 5}))
+    assert db.get_user(1)["balance"] == 5
+    assert db.get_user(1)["balance"] == 5
+    assert users.reads == 1
+    assert db.user_cache_stats()["hits"] == 1
+
+
+def test_cached_copy_is_isolated_from_caller(monkeypatch):
+    use_users(monkeypatch, FakeUsers({"telegram_id": 1, "balance": 5}))
+    db.get_user(1)["balance"] = 999
+    assert db.get_user(1)["balance"] == 5
+
+
+def test_lru_evicts_least_recently_used(monkeypatch):
+    users = use_users(monkeypatch, FakeUsers({"balance": 0}))
+    for tid in (1, 2, 3):
+        db.get_user(tid)
+    db.get_user(1)      # 1 يصبح الأحدث
+    db.get_user(4)      # يطرد 2
+    assert list(db._user_cache) == [3, 1, 4]
+    reads = users.reads
+    db.get_user(2)
+    assert users.reads == reads + 1
+
+
+def test_ttl_expiry_rereads(monkeypatch):
+    users = use_users(monkeypatch, FakeUsers({"balance": 0}))
+    monkeypatch.setattr(db, "USER_CACHE_TTL", 0)
+    db.get_user(1)
+    db.get_user(1)
+    assert users.reads == 2
+
+
+def test_invalidate_forces_reread(monkeypatch):
+    users = use_users(monkeypatch, FakeUsers({"balance": 1}))
+    db.get_user(1)
+    users.doc = {"balance": 2}
+    db.invalidate_user(1)
+    assert db.get_user(1)["balance"] == 2
+    assert users.reads == 2
+
+
+def test_read_racing_a_write_is_not_cached(monkeypatch):
+    users = FakeUsers({"balance": 1}, during_read=lambda: db.invalidate_user(1))
+    use_users(monkeypatch, users)
+    assert db.get_user(1)["balance"] == 1
+    assert 1 not in db._user_cache
+    assert db.user_cache_stats()["stale_skipped"] == 1
+
+    users.during_read = None
+    users.doc = {"balance": 2}
+    assert db.get_user(1)["balance"] == 2
+    assert db.get_user(1)["balance"] == 2
+    assert users.reads == 2
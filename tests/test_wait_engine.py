@@ -0,0 +1,64 @@
+import pytest
+
+pytest.importorskip("selenium")
+
+from wait_engine import Waiter, EMPTY_STATE_SELECTOR, XHR_QUIET_JS
+
+
+class FakeDriver:
+    """متصفح وهمي: عدد صفوف ثابت، ورسالة جدول فارغ اختيارية، وحالة متتبع XHR"""
+
+    def __init__(self, rows=0, empty_state=False, quiet_ms=-1, ready="complete"):
+        self.rows = rows
+        self.empty_state = empty_state
+        self.quiet_ms = quiet_ms
+        self.ready = ready
+
+    def find_elements(self, by, value):
+        if value == EMPTY_STATE_SELECTOR:
+            return [object()] if self.empty_state else []
+        return [object()] * self.rows
+
+    def execute_script(self, script):
+        if script == XHR_QUIET_JS:
+            return self.quiet_ms
+        return self.ready
+
+
+def waiter(driver):
+    return Waiter(driver, profile="fast")
+
+
+def test_rows_rendered_with_stable_rows():
+    assert waiter(FakeDriver(rows=3)).rows_rendered(timeout=1, stable_ms=50)
+
+
+def test_zero_rows_accepted_with_empty_state():
+    driver = FakeDriver(rows=0, empty_state=True, quiet_ms=0)
+    assert waiter(driver).rows_rendered(timeout=1, stable_ms=50)
+
+
+def test_zero_rows_accepted_once_xhr_quiet():
+    driver = FakeDriver(rows=0, quiet_ms=1000)
+    assert waiter(driver).rows_rendered(timeout=1, stable_ms=50, quiet_ms=500)
+
+
+def test_zero_rows_rejected_while_request_in_flight():
+    driver = FakeDriver(rows=0, quiet_ms=0)
+    assert not waiter(driver).rows_rendered(timeout=0.5, stable_ms=50)
+
+
+def test_zero_rows_without_tracker_falls_back_to_ready_state():
+    assert waiter(FakeDriver(rows=0, quiet_ms=-1)).rows_rendered(timeout=1, stable_ms=50)
+    assert not waiter(FakeDriver(rows=0, quiet_ms=-1, ready="loading")).rows_rendered(timeout=0.5, stable_ms=50)
+
+
+def test_xhr_idle_requires_quiet_period():
+    assert waiter(FakeDriver(quiet_ms=600)).xhr_idle(timeout=0.5, quiet_ms=500)
+    assert not waiter(FakeDriver(quiet_ms=100)).xhr_idle(timeout=0.5, quiet_ms=500)
+
+
+def test_waits_are_recorded_in_report():
+    w = waiter(FakeDriver(rows=1))
+    w.rows_rendered(timeout=1, stable_ms=10)
+    assert w.report()["waits"]["rows_rendered"]["count"] == 1
@@ -0,0 +1,109 @@
+# update_dispatcher.py - ترتيب تحديثات كل مستخدم مع معالجة المستخدمين المختلفين بالتوازي
+import os
+import time
+import threading
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# الإعدادات
+# =========================
+DISPATCH_WORKERS = int(os.getenv("DISPATCH_WORKERS", "8"))
+# أقصى عدد تحديثات قيد الانتظار/المعالجة قبل أن يعلق submit (ضغط عكسي نحو الطابور)
+DISPATCH_MAX_PENDING = int(os.getenv("DISPATCH_MAX_PENDING", "500"))
+
+# حقول التحديث التي تحمل from_user بالترتيب
+_USER_FIELDS = (
+    "message", "edited_message", "callback_query", "inline_query",
+    "chosen_inline_result", "shipping_query", "pre_checkout_query",
+    "poll_answer", "my_chat_member", "chat_member", "chat_join_request",
+)
+
+
+def update_key(update):
+    """مفتاح المسار: معرف المستخدم، أو معرف التحديث إذا لم يكن له مستخدم (بدون ترتيب)"""
+    for field in _USER_FIELDS:
+        obj = getattr(update, field, None)
+        if obj is None:
+            continue
+        user = getattr(obj, "from_user", None) or getattr(obj, "user", None)
+        if user is not None:
+            return user.id
+    return f"update:{update.update_id}"
+
+
+class KeyedDispatcher:
+    """مسار تسلسلي لكل مفتاح: تحديثات نفس المستخدم بالترتيب، والمسارات تتوزع على مجمع threads"""
+
+    def __init__(self, handler, workers=DISPATCH_WORKERS, max_pending=DISPATCH_MAX_PENDING):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="lane")
+        self._lanes = {}
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(1, max_pending))
+        self.max_pending = max(1, max_pending)
+
+        self._pending = 0
+        self._processed = 0
+        self._failed = 0
+        self._max_lane_depth = 0
+        self._lane_wait_max = 0.0
+
+    def submit(self, update, key=None):
+        """جدولة تحديث في مسار مستخدمه (يعلق إذا امتلأ الحد الأقصى)"""
+        key = update_key(update) if key is None else key
+        self._slots.acquire()
+        with self._lock:
+            self._pending += 1
+            lane = self._lanes.get(key)
+            if lane is not None:
+                # المسار يعمل: التحديث ينتظر خلف تحديثات نفس المستخدم
+                lane.append((time.monotonic(), update))
+                self._max_lane_depth = max(self._max_lane_depth, len(lane))
+                return
+            self._lanes[key] = deque([(time.monotonic(), update)])
+        self._executor.submit(self._run_lane, key)
+
+    def _run_lane(self, key):
+        """تنفيذ تحديثات المسار واحداً تلو الآخر حتى يفرغ"""
+        while True:
+            with self._lock:
+                lane = self._lanes[key]
+                if not lane:
+                    del self._lanes[key]
+                    return
+                enqueued_at, update = lane.popleft()
+                self._lane_wait_max = max(self._lane_wait_max, time.monotonic() - enqueued_at)
+
+            try:
+                self.handler(update)
+                failed = False
+            except Exception as e:
+                logger.error(f"❌ فشل معالجة تحديث للمستخدم {key}: {e}")
+                failed = True
+            finally:
+                self._slots.release()
+
+            with self._lock:
+                self._pending -= 1
+                if failed:
+                    self._failed += 1
+                else:
+                    self._processed += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "active_lanes": len(self._lanes),
+                "pending": self._pending,
+                "max_pending": self.max_pending,
+                "processed": self._processed,
+                "failed": self._failed,
+                "max_lane_depth": self._max_lane_depth,
+                "lane_wait_max_ms": round(self._lane_wait_max * 1000),
+            }
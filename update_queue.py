@@ -0,0 +1,132 @@
+# update_queue.py - طابور محدود لتحديثات Telegram بين الـ webhook ومعالجات البوت
+import os
+import time
+import threading
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# الإعدادات
+# =========================
+UPDATE_QUEUE_MAX = int(os.getenv("UPDATE_QUEUE_MAX", "1000"))
+# عدد العمال عندما يعالج الطابور التحديثات بنفسه؛ webhook_app ينقلها إلى المُوزّع بعامل واحد
+# والتوازي هناك يضبطه DISPATCH_WORKERS
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", "8"))
+# drop_new (رفض الجديد) | drop_oldest (إسقاط الأقدم) | block (انتظار مكان حتى المهلة)
+UPDATE_OVERFLOW_POLICY = os.getenv("UPDATE_OVERFLOW_POLICY", "drop_oldest")
+UPDATE_BLOCK_TIMEOUT = float(os.getenv("UPDATE_BLOCK_TIMEOUT", "2"))
+
+OVERFLOW_POLICIES = ("drop_new", "drop_oldest", "block")
+
+
+class UpdateQueue:
+    """طابور تحديثات محدود: put لا يعلق أكثر من مهلة block، والعمال يعالجون في الخلفية"""
+
+    def __init__(self, handler, workers=UPDATE_WORKERS, maxsize=UPDATE_QUEUE_MAX,
+                 policy=UPDATE_OVERFLOW_POLICY, block_timeout=UPDATE_BLOCK_TIMEOUT):
+        if policy not in OVERFLOW_POLICIES:
+            logger.warning(f"⚠️ سياسة امتلاء غير معروفة '{policy}'، استخدام drop_oldest")
+            policy = "drop_oldest"
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.maxsize = max(1, maxsize)
+        self.policy = policy
+        self.block_timeout = block_timeout
+
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._running = 0
+
+        # مقاييس الضغط
+        self._received = 0
+        self._dropped = 0
+        self._processed = 0
+        self._failed = 0
+        self._high_watermark = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def start(self):
+        with self._cond:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, daemon=True, name=f"update-worker-{i}")
+                t.start()
+                self._threads.append(t)
+        logger.info(f"📬 طابور التحديثات: {self.workers} عامل، سعة {self.maxsize}، سياسة {self.policy}")
+
+    def put(self, update):
+        """إضافة تحديث - يعيد False إذا أُسقط (الطلب يُرد عليه بـ 200 في كل الأحوال)"""
+        self.start()
+        with self._cond:
+            self._received += 1
+
+            if len(self._items) >= self.maxsize:
+                if self.policy == "drop_new":
+                    self._dropped += 1
+                    return False
+                if self.policy == "drop_oldest":
+                    self._items.popleft()
+                    self._dropped += 1
+                else:
+                    deadline = time.monotonic() + self.block_timeout
+                    while len(self._items) >= self.maxsize:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._dropped += 1
+                            return False
+                        self._cond.wait(remaining)
+
+            self._items.append((time.monotonic(), update))
+            self._high_watermark = max(self._high_watermark, len(self._items))
+            self._cond.notify_all()
+            return True
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._items:
+                    self._cond.wait()
+                enqueued_at, update = self._items.popleft()
+                self._running += 1
+                waited = time.monotonic() - enqueued_at
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+                # إيقاظ من ينتظر مكاناً (سياسة block)
+                self._cond.notify_all()
+
+            try:
+                self.handler(update)
+                failed = False
+            except Exception as e:
+                logger.error(f"❌ فشل معالجة تحديث: {e}")
+                failed = True
+
+            with self._cond:
+                self._running -= 1
+                if failed:
+                    self._failed += 1
+                else:
+                    self._processed += 1
+
+    def stats(self):
+        with self._cond:
+            started = self._processed + self._failed + self._running
+            return {
+                "depth": len(self._items),
+                "maxsize": self.maxsize,
+                "high_watermark": self._high_watermark,
+                "policy": self.policy,
+                "workers": self.workers,
+                "running": self._running,
+                "received": self._received,
+                "dropped": self._dropped,
+                "processed": self._processed,
+                "failed": self._failed,
+                "wait_avg_ms": round(self._wait_total / started * 1000) if started else 0,
+                "wait_max_ms": round(self._wait_max * 1000),
+            }
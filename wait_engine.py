@@ -0,0 +1,187 @@
+# wait_engine.py - انتظار على شروط فعلية بدلاً من time.sleep الثابت
+import os
+import time
+import random
+import logging
+import threading
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# ملفات التأخير البشري
+# =========================
+# المدى الأساسي لكل نوع تأخير (قيم النسخة الأصلية) ومعامل كل ملف
+HUMAN_DELAYS = {
+    "click": (0.5, 1.5),
+    "before_type": (0.3, 0.8),
+    "keystroke": (0.05, 0.15),
+    "between_fields": (1, 2),
+    "after_load": (1, 3),
+}
+
+PROFILES = {
+    "stealth": 1.0,
+    "balanced": 0.35,
+    "fast": 0.0,
+}
+
+DEFAULT_PROFILE = os.getenv("ICHANCY_WAIT_PROFILE", "balanced")
+POLL_INTERVAL = float(os.getenv("ICHANCY_WAIT_POLL", "0.2"))
+
+# رسالة "لا توجد بيانات" في الجداول الشائعة: نتيجة بحث فارغة هي نتيجة نهائية
+EMPTY_STATE_SELECTOR = (
+    ".ant-empty, .el-table__empty-block, .dataTables_empty, .mat-no-data-row, "
+    ".no-data, .empty-state"
+)
+
+# -1 = المتتبع غير مثبت، 0 = طلبات جارية، غير ذلك = مدة الهدوء بالميلي ثانية
+XHR_QUIET_JS = (
+    "return window.__pendingRequests === undefined ? -1 : "
+    "(window.__pendingRequests === 0 ? Date.now() - window.__lastRequestAt : 0);"
+)
+
+# يُحقن قبل أي script في الصفحة لعد طلبات fetch/XHR الجارية
+XHR_TRACKER_JS = """
+(function () {
+    if (window.__pendingRequests !== undefined) return;
+    window.__pendingRequests = 0;
+    window.__lastRequestAt = Date.now();
+    var done = function () {
+        window.__pendingRequests = Math.max(0, window.__pendingRequests - 1);
+        window.__lastRequestAt = Date.now();
+    };
+    var origFetch = window.fetch;
+    if (origFetch) {
+        window.fetch = function () {
+            window.__pendingRequests++;
+            window.__lastRequestAt = Date.now();
+            return origFetch.apply(this, arguments).finally(done);
+        };
+    }
+    var origSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function () {
+        window.__pendingRequests++;
+        window.__lastRequestAt = Date.now();
+        this.addEventListener('loadend', done);
+        return origSend.apply(this, arguments);
+    };
+})();
+"""
+
+
+class Waiter:
+    """طبقة انتظار على الشروط مع ملف تأخير بشري قابل للضبط وقياس زمن كل انتظار"""
+
+    def __init__(self, driver, profile=None):
+        self.driver = driver
+        self.profile = profile if profile in PROFILES else DEFAULT_PROFILE
+        self.scale = PROFILES.get(self.profile, PROFILES["balanced"])
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def install(self):
+        """تثبيت متتبع الطلبات على كل صفحة جديدة"""
+        try:
+            self.driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": XHR_TRACKER_JS})
+        except WebDriverException as e:
+            logger.warning(f"⚠️ تعذر تثبيت متتبع XHR: {e}")
+
+    # =========================
+    # القياس
+    # =========================
+    def _record(self, label, elapsed):
+        with self._lock:
+            count, total = self._stats.get(label, (0, 0.0))
+            self._stats[label] = (count + 1, total + elapsed)
+
+    def report(self):
+        """متوسط زمن كل نوع انتظار لهذا الملف"""
+        with self._lock:
+            return {
+                "profile": self.profile,
+                "waits": {
+                    label: {"count": count, "avg_s": round(total / count, 3), "total_s": round(total, 2)}
+                    for label, (count, total) in self._stats.items()
+                },
+            }
+
+    # =========================
+    # التأخير البشري
+    # =========================
+    def humanize(self, kind):
+        """تأخير عشوائي مصغر حسب الملف (صفر في fast)"""
+        if self.scale <= 0:
+            return
+        low, high = HUMAN_DELAYS[kind]
+        delay = random.uniform(low, high) * self.scale
+        time.sleep(delay)
+        self._record(f"human:{kind}", delay)
+
+    # =========================
+    # الشروط
+    # =========================
+    def until(self, condition, timeout=10, label="condition"):
+        """انتظار شرط - يعيد True إذا تحقق وFalse عند انتهاء المهلة"""
+        started = time.monotonic()
+        try:
+            WebDriverWait(self.driver, timeout, poll_frequency=POLL_INTERVAL).until(condition)
+            return True
+        except TimeoutException:
+            logger.debug(f"⏳ انتهت مهلة الانتظار: {label}")
+            return False
+        finally:
+            self._record(label, time.monotonic() - started)
+
+    def page_loaded(self, timeout=20):
+        return self.until(
+            lambda d: d.execute_script("return document.readyState") == "complete",
+            timeout,
+            "page_loaded",
+        )
+
+    def url_changed(self, old_url, timeout=20):
+        return self.until(lambda d: d.current_url != old_url, timeout, "url_changed")
+
+    def visible(self, by, value, timeout=10):
+        def _visible(d):
+            elements = d.find_elements(by, value)
+            return any(e.is_displayed() for e in elements)
+        return self.until(_visible, timeout, "visible")
+
+    @staticmethod
+    def _is_idle(d, quiet_ms):
+        quiet = d.execute_script(XHR_QUIET_JS)
+        # المتتبع غير مثبت: نكتفي بحالة تحميل المستند
+        if quiet == -1:
+            return d.execute_script("return document.readyState") == "complete"
+        return quiet >= quiet_ms
+
+    def xhr_idle(self, timeout=15, quiet_ms=500):
+        """لا طلبات جارية منذ quiet_ms على الأقل"""
+        return self.until(lambda d: self._is_idle(d, quiet_ms), timeout, "xhr_idle")
+
+    def rows_rendered(self, timeout=15, stable_ms=300, quiet_ms=500):
+        """ثبات عدد صفوف الجدول - صفر صفوف مقبول بعد انتهاء طلب البحث أو ظهور رسالة الجدول الفارغ"""
+        state = {"count": -1, "since": time.monotonic()}
+
+        def _rendered(d):
+            count = len(d.find_elements(By.CSS_SELECTOR, "table tbody tr"))
+            now = time.monotonic()
+            if count != state["count"]:
+                state["count"], state["since"] = count, now
+                return False
+            if (now - state["since"]) * 1000 < stable_ms:
+                return False
+            if count > 0:
+                return True
+            # البحث لم يُرجع شيئاً (الاسم متاح - الحالة الأكثر شيوعاً)
+            return bool(d.find_elements(By.CSS_SELECTOR, EMPTY_STATE_SELECTOR)) or self._is_idle(d, quiet_ms)
+        return self.until(_rendered, timeout, "rows_rendered")
+
+    def settle(self, timeout=15):
+        """تحميل الصفحة ثم هدوء الشبكة - بديل عن sleep بعد التنقل"""
+        self.page_loaded(timeout)
+        self.xhr_idle(timeout)
@@ -1,12 +1,19 @@
 import os
-from flask import Flask, request
+import threading
+from flask import Flask, request, jsonify
 from telebot import types
-from main import bot
+import startup_timing
+import telegram_sender
+import selenium_jobs
+from main import bot, dispatcher, init_ichancy_api, ALLOWED_UPDATES
+from update_queue import UpdateQueue
 
 app = Flask(__name__)
 
 BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+# كل عامل gunicorn يسخّن متصفحاته فقط عند الطلب الصريح (الأصل: المتصفحات في selenium_worker)
+WEB_PREWARM_BROWSERS = os.getenv("WEB_PREWARM_BROWSERS", "0") == "1"
 
 if not BOT_TOKEN:
     raise ValueError("TELEGRAM_BOT_TOKEN is missing")
@@ -20,21 +27,47 @@ if not WEBHOOK_URL:
 def setup_webhook():
     url = f"{WEBHOOK_URL}/{BOT_TOKEN}"
     bot.remove_webhook()
-    success = bot.set_webhook(url)
+    success = bot.set_webhook(url, allowed_updates=ALLOWED_UPDATES)
     print("Webhook set:", success)
 
 setup_webhook()
+startup_timing.mark("webhook_ready")
+
+# في وضع stream لا متصفحات في عمليات الويب إطلاقاً
+if WEB_PREWARM_BROWSERS and not selenium_jobs.use_stream():
+    threading.Thread(target=init_ichancy_api, daemon=True).start()
+
+# =========================
+# طابور التحديثات
+# =========================
+def process_update(json_data):
+    dispatcher.submit(types.Update.de_json(json_data))
+
+# الطابور هنا لا يعالج التحديثات: عامله ينقلها فقط إلى مسارات المُوزّع (KeyedDispatcher)
+# التي تعالجها بالتوازي بين المستخدمين وبالترتيب لكل مستخدم، وعددها DISPATCH_WORKERS.
+# عامل نقل واحد مقصود: عاملان قد يسلّمان تحديثين لنفس المستخدم بترتيب معكوس،
+# لذلك لا يُستخدم UPDATE_WORKERS في هذه العملية.
+QUEUE_DRAIN_WORKERS = 1
+update_queue = UpdateQueue(process_update, workers=QUEUE_DRAIN_WORKERS)
+update_queue.start()
 
 # =========================
 # استقبال التحديثات
 # =========================
 @app.route(f"/{BOT_TOKEN}", methods=["POST"])
 def webhook():
-    json_data = request.get_json(force=True)
-    update = types.Update.de_json(json_data)
-    bot.process_new_updates([update])
+    # الرد فوراً: المعالجة في العمال حتى لا يعيد Telegram الإرسال ويبطئ
+    update_queue.put(request.get_json(force=True))
     return "OK", 200
 
+@app.route("/metrics")
+def metrics():
+    return jsonify({
+        "update_queue": update_queue.stats(),
+        "dispatcher": dispatcher.stats(),
+        "telegram_sender": telegram_sender.get_sender().stats(),
+    })
+
 # =========================
 # اختبار
 # =========================